@@ -0,0 +1,70 @@
+"""Benchmarks the apply phase against the fake Gmail service.
+
+Compares one messages.modify call per email (the old behaviour) with
+organizer.apply_labels, which groups emails by label and uses batchModify.
+
+Usage:
+    python benchmarks/bench_apply_labels.py --messages 5000 --latency 0.02
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+# Add the current directory to sys.path to allow imports from src
+sys.path.append(os.getcwd())
+
+from benchmarks.fake_gmail import FakeGmailService
+from src.gmail_client import apply_label, create_label
+from src.organizer import apply_labels
+
+CATEGORIES = ["Shopping & E-Commerce", "Finance & Payments", "Travel & Transport", "Updates & Content"]
+
+
+def make_corrected_data(service, rng):
+    return [
+        {
+            "training_data": {"output": rng.choice(CATEGORIES)},
+            "metadata": {"email_id": message_id, "subject": f"Email {message_id}"},
+        }
+        for message_id in service.message_ids
+    ]
+
+
+def apply_one_by_one(service, corrected_data):
+    label_ids = {category: create_label(service, category) for category in CATEGORIES}
+    for entry in corrected_data:
+        apply_label(service, entry["metadata"]["email_id"], label_ids[entry["training_data"]["output"]])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=1000)
+    parser.add_argument("--latency", type=float, default=0.02, help="Simulated seconds per HTTP round trip")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    results = []
+    for name, apply in (("one modify per email", apply_one_by_one), ("grouped batchModify", apply_labels)):
+        service = FakeGmailService(num_messages=args.messages, body_size=100, latency=args.latency)
+        corrected_data = make_corrected_data(service, rng)
+        # The per-email path prints a line per message; keep the report readable.
+        with open(os.devnull, "w") as devnull:
+            stdout, sys.stdout = sys.stdout, devnull
+            try:
+                start = time.perf_counter()
+                apply(service, corrected_data)
+                elapsed = time.perf_counter() - start
+            finally:
+                sys.stdout = stdout
+        results.append((name, len(corrected_data), service.round_trips, elapsed))
+
+    print(f"\n{'MODE':<22} | {'EMAILS':>6} | {'HTTP':>5} | {'SECONDS':>8} | {'EMAILS/S':>9}")
+    print("-" * 64)
+    for name, count, round_trips, elapsed in results:
+        print(f"{name:<22} | {count:>6} | {round_trips:>5} | {elapsed:>8.2f} | {count / elapsed:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
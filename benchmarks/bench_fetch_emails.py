@@ -0,0 +1,69 @@
+"""Benchmarks fetch_emails against the fake Gmail service.
+
+Compares one request per message (the old N+1 behaviour) with the batched
+path (with full and metadata-only projections) and reports messages and
+HTTP requests per second and the bytes transferred.
+
+Usage:
+    python benchmarks/bench_fetch_emails.py --messages 1000 --latency 0.05
+"""
+import argparse
+import os
+import sys
+import time
+
+# Add the current directory to sys.path to allow imports from src
+sys.path.append(os.getcwd())
+
+from benchmarks.fake_gmail import FakeGmailService
+from src.gmail_client import fetch_emails
+
+
+def run(service, num_messages, batch_size, max_in_flight, projection="full"):
+    service.reset_counters()
+    start = time.perf_counter()
+    emails = fetch_emails(
+        service, query="is:inbox", max_results=num_messages,
+        batch_size=batch_size, max_in_flight=max_in_flight, use_cache=False,
+        projection=projection,
+    )
+    elapsed = time.perf_counter() - start
+    return len(emails), elapsed, service.round_trips, service.bytes_sent
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.05, help="Simulated seconds per HTTP round trip")
+    parser.add_argument("--body-size", type=int, default=2000)
+    parser.add_argument("--batch-size", type=int, default=50)
+    parser.add_argument("--max-in-flight", type=int, default=4)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    service = FakeGmailService(
+        num_messages=args.messages, body_size=args.body_size,
+        latency=args.latency, error_rate=args.error_rate,
+    )
+
+    batched = f"batched ({args.batch_size} x {args.max_in_flight})"
+    modes = [
+        ("one per message", 1, 1, "full"),
+        (batched, args.batch_size, args.max_in_flight, "full"),
+        (f"{batched}, metadata", args.batch_size, args.max_in_flight, "metadata"),
+    ]
+
+    results = [
+        (name, *run(service, args.messages, batch_size, max_in_flight, projection))
+        for name, batch_size, max_in_flight, projection in modes
+    ]
+
+    print(f"\n{'MODE':<34} | {'EMAILS':>6} | {'HTTP':>5} | {'KB':>8} | {'SECONDS':>8} | {'EMAILS/S':>9} | {'HTTP/S':>7}")
+    print("-" * 96)
+    for name, count, elapsed, round_trips, bytes_sent in results:
+        print(f"{name:<34} | {count:>6} | {round_trips:>5} | {bytes_sent / 1024:>8.0f} | {elapsed:>8.2f} | "
+              f"{count / elapsed:>9.1f} | {round_trips / elapsed:>7.1f}")
+
+
+if __name__ == "__main__":
+    main()
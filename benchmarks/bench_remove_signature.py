@@ -0,0 +1,128 @@
+"""Micro-benchmark for remove_signature on short and 1 MB inputs.
+
+Times the current implementation against the previous one (kept below as
+a reference, compiling its patterns on every call and scanning once per
+pattern) and checks that both return identical results.
+
+Usage:
+    python benchmarks/bench_remove_signature.py --repeat 200
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+# Add the current directory to sys.path to allow imports from src
+sys.path.append(os.getcwd())
+
+from src.remove_signature import remove_signature
+
+
+def remove_signature_reference(text):
+    """The pattern-per-pass implementation remove_signature replaced."""
+    if not text:
+        return "", ""
+    patterns = {
+        'delimiters': [
+            r'\n\s*--\s*\n', r'\n\s*={3,}\s*\n', r'\n\s*_{3,}\s*\n',
+            r'\n\s*-{3,}\s*\n', r'\n\s*\*{3,}\s*\n', r'\n\s*-{3,}\s*$',
+        ],
+        'closings': [
+            r'\n\s*(?:Best regards?|Regards?|Kind regards?|Warm regards?|Brgds?|Cheers|Thanks?|Thank you|Many thanks|Sincerely|Cordially|Warmly|Best|Sent from my .*?)\s*,?\s*(?=\n|$)',
+            r'\n\s*(?:Cordialement|Bien cordialement|Salutations|Meilleures salutations|Amicalement|Merci|Bien à vous|Respectueusement)\s*,?\s*(?=\n|$)',
+            r'\n\s*(?:Mit freundlichen Grüßen|Freundliche Grüße|Viele Grüße|Herzliche Grüße|Beste Grüße)\s*,?\s*(?=\n|$)',
+            r'\n\s*(?:Cordiali saluti|Distinti saluti|Saluti|Grazie|Un saluto|Cari saluti)\s*,?\s*(?=\n|$)',
+            r'\n\s*(?:Met vriendelijke groet|Vriendelijke groeten|Hartelijke groeten|Groeten)\s*,?\s*(?=\n|$)',
+            r'\n\s*(?:Mat frëndleche Gréiss|Frëndlech Gréiss|Villmools Merci|Merci)\s*,?\s*(?=\n|$)',
+        ],
+        'markdown': [r'\n\n\s*!\[.*?\]\(.*?\)'],
+    }
+    candidates = []
+    for pattern_str in patterns['delimiters']:
+        for match in re.compile(pattern_str, re.MULTILINE).finditer(text):
+            candidates.append(match.start())
+    for pattern_str in patterns['closings']:
+        matches = list(re.compile(pattern_str, re.IGNORECASE | re.MULTILINE).finditer(text))
+        if matches:
+            candidates.append(matches[-1].start())
+    for pattern_str in patterns['markdown']:
+        for match in re.compile(pattern_str, re.IGNORECASE | re.MULTILINE | re.DOTALL).finditer(text):
+            candidates.append(match.start())
+    if candidates:
+        earliest_pos = min(candidates)
+        return text[:earliest_pos], text[earliest_pos:].strip()
+    return text, ""
+
+
+SHORT_EMAIL = """Hi Anna,
+
+Thanks for sending the report over. I had a look and the numbers for Q3
+match what we discussed on Monday. Let's go through the open points on
+Thursday.
+
+Thanks,
+Bob
+
+Sent from my iPhone
+"""
+
+FUZZ_PIECES = [
+    "\n", "\n\n", " ", "\t", "Thanks", "thanks,", "Merci", "Grazie", ",", "Best regards",
+    "Sent from my phone", "--", "---", "===", "***", "![img](x)", "Hello", "world",
+    "Mit freundlichen Grüßen", "Groeten", "\r\n", " ",
+]
+
+
+def make_large_email(size):
+    rng = random.Random(0)
+    paragraph = "The quarterly figures are attached; let me know if anything looks off.\n"
+    lines = []
+    total = 0
+    while total < size:
+        line = rng.choice([paragraph, "> " + paragraph, "\n", "Thanks\n", "Regards,\n", "https://example.com/x\n"])
+        lines.append(line)
+        total += len(line)
+    return "".join(lines) + "\n--\nBob\n"
+
+
+def check_equivalence(cases):
+    rng = random.Random(1)
+    for _ in range(cases):
+        text = "".join(rng.choice(FUZZ_PIECES) for _ in range(rng.randint(0, 16)))
+        if remove_signature(text) != remove_signature_reference(text):
+            raise AssertionError(f"Results differ for {text!r}")
+
+
+def timeit(fn, text, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn(text)
+    return (time.perf_counter() - start) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=200, help="Calls per measurement on the short input")
+    parser.add_argument("--fuzz", type=int, default=20000, help="Random inputs compared against the reference")
+    args = parser.parse_args()
+
+    check_equivalence(args.fuzz)
+    print(f"Identical results on {args.fuzz} random inputs")
+
+    inputs = [
+        ("short", SHORT_EMAIL, args.repeat),
+        ("1 MB", make_large_email(1024 * 1024), max(1, args.repeat // 100)),
+    ]
+    print(f"\n{'INPUT':<8} | {'REFERENCE':>12} | {'CURRENT':>12} | {'SPEEDUP':>7}")
+    print("-" * 50)
+    for name, text, repeat in inputs:
+        assert remove_signature(text) == remove_signature_reference(text)
+        before = timeit(remove_signature_reference, text, repeat)
+        after = timeit(remove_signature, text, repeat)
+        print(f"{name:<8} | {before * 1e6:>9.1f} us | {after * 1e6:>9.1f} us | {before / after:>6.1f}x")
+
+
+if __name__ == "__main__":
+    main()
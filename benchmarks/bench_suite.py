@@ -0,0 +1,181 @@
+"""Offline throughput suite for the organizer's stages.
+
+Runs fetch_emails, categorize_email, remove_signature and the apply phase
+against the fake Gmail service and a local fake OpenAI-compatible LLM
+server, for each message count, and reports emails/s, p50/p99 latency and
+peak RSS. Latency is per HTTP request for the Gmail stages, per
+categorize_email call for the LLM stage and per call for remove_signature.
+Each stage and size runs in its own process, so peak RSS is measured
+separately for each.
+
+Usage:
+    python benchmarks/bench_suite.py --sizes 100,1000,10000 --latency 0.05 --llm-latency 0.02
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Add the current directory to sys.path to allow imports from src
+sys.path.append(os.getcwd())
+
+from benchmarks.fake_gmail import FakeGmailService, make_message
+from benchmarks.fake_llm_server import FakeLLMServer
+
+STAGES = ("fetch", "categorize", "signature", "apply")
+CATEGORIES = ["Shopping & E-Commerce", "Finance & Payments", "Travel & Transport", "Updates & Content"]
+SIGNATURE = "\n\nBest regards,\nJane Doe\nAccount Manager\n--\nSent from my phone"
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))] if values else 0.0
+
+
+def peak_rss_mb():
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+def make_emails(count, body_size):
+    from src.gmail_client import parse_message
+    return [parse_message(m["id"], m) for m in (make_message(i, body_size) for i in range(count))]
+
+
+def bench_fetch(args):
+    from src.gmail_client import fetch_emails
+    service = FakeGmailService(num_messages=args.messages, body_size=args.body_size, latency=args.latency)
+    start = time.perf_counter()
+    emails = fetch_emails(service, query="is:inbox", max_results=args.messages, use_cache=False)
+    return len(emails), time.perf_counter() - start, service.latencies
+
+
+def bench_categorize(args):
+    from src.llm_client import DEFAULT_CONCURRENCY, categorize_email, configure_llm
+    configure_llm()
+    emails = make_emails(args.messages, args.body_size)
+
+    def timed(email):
+        start = time.perf_counter()
+        categorize_email(email["subject"], email["snippet"], email["body"], use_cache=False)
+        return time.perf_counter() - start
+
+    concurrency = int(os.getenv("LLM_CONCURRENCY", DEFAULT_CONCURRENCY))
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        latencies = list(executor.map(timed, emails))
+    return len(emails), time.perf_counter() - start, latencies
+
+
+def bench_signature(args):
+    from src.remove_signature import remove_signature
+    emails = make_emails(args.messages, args.body_size)
+    bodies = [email["body"] + SIGNATURE for email in emails]
+    latencies = []
+    for body in bodies:
+        start = time.perf_counter()
+        remove_signature(body)
+        latencies.append(time.perf_counter() - start)
+    return len(bodies), sum(latencies), latencies
+
+
+def bench_apply(args):
+    from src.organizer import apply_labels
+    service = FakeGmailService(num_messages=args.messages, body_size=100, latency=args.latency)
+    rng = random.Random(0)
+    corrected_data = [
+        {
+            "training_data": {"output": rng.choice(CATEGORIES)},
+            "metadata": {"email_id": message_id, "subject": f"Email {message_id}"},
+        }
+        for message_id in service.message_ids
+    ]
+    start = time.perf_counter()
+    apply_labels(service, corrected_data)
+    return len(corrected_data), time.perf_counter() - start, service.latencies
+
+
+# Each returns (emails, seconds spent in the stage itself, per-call latencies)
+BENCHMARKS = {"fetch": bench_fetch, "categorize": bench_categorize, "signature": bench_signature, "apply": bench_apply}
+
+
+def run_worker(args):
+    """Runs one stage in this process and prints its result as JSON on the last line."""
+    with open(os.devnull, "w") as devnull:
+        stdout, sys.stdout = sys.stdout, devnull
+        try:
+            count, elapsed, latencies = BENCHMARKS[args.worker](args)
+        finally:
+            sys.stdout = stdout
+    print(json.dumps({
+        "stage": args.worker,
+        "emails": count,
+        "seconds": elapsed,
+        "emails_per_second": count / elapsed,
+        "p50_ms": percentile(latencies, 0.5) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "peak_rss_mb": peak_rss_mb(),
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="100,1000,10000", help="Comma-separated message counts")
+    parser.add_argument("--stages", default=",".join(STAGES), help=f"Comma-separated subset of {','.join(STAGES)}")
+    parser.add_argument("--latency", type=float, default=0.05, help="Simulated seconds per Gmail HTTP round trip")
+    parser.add_argument("--llm-latency", type=float, default=0.02, help="Simulated seconds per LLM completion")
+    parser.add_argument("--body-size", type=int, default=2000)
+    parser.add_argument("--output", help="Also write the results to this JSON file")
+    parser.add_argument("--worker", choices=STAGES, help=argparse.SUPPRESS)
+    parser.add_argument("--messages", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args)
+        return
+
+    stages = [stage.strip() for stage in args.stages.split(",") if stage.strip()]
+    sizes = [int(size) for size in args.sizes.split(",")]
+    results = []
+    with FakeLLMServer(latency=args.llm_latency) as server:
+        env = {
+            **os.environ,
+            "USE_LOCAL_LLM": "true",
+            "LOCAL_LLM_API": "openai",
+            "LOCAL_LLM_BASE_URL": server.base_url,
+            "LOCAL_LLM_MODEL": server.model,
+            "LOCAL_LLM_CONTEXT_LENGTH": str(server.context_length),
+        }
+        for stage in stages:
+            for size in sizes:
+                print(f"Running {stage} with {size} emails...")
+                completed = subprocess.run(
+                    [sys.executable, __file__, "--worker", stage, "--messages", str(size),
+                     "--latency", str(args.latency), "--body-size", str(args.body_size)],
+                    env=env, capture_output=True, text=True,
+                )
+                if completed.returncode != 0:
+                    print(completed.stderr)
+                    sys.exit(f"{stage} benchmark failed with {size} emails")
+                results.append(json.loads(completed.stdout.strip().splitlines()[-1]))
+
+    print(f"\n{'STAGE':<10} | {'EMAILS':>6} | {'SECONDS':>8} | {'EMAILS/S':>9} | {'P50 MS':>8} | {'P99 MS':>8} | {'PEAK RSS MB':>11}")
+    print("-" * 82)
+    for r in results:
+        print(f"{r['stage']:<10} | {r['emails']:>6} | {r['seconds']:>8.2f} | {r['emails_per_second']:>9.1f} | "
+              f"{r['p50_ms']:>8.2f} | {r['p99_ms']:>8.2f} | {r['peak_rss_mb']:>11.1f}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=4)
+        print(f"\nResults written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
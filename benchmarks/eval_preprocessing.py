@@ -0,0 +1,72 @@
+"""Checks that body preprocessing keeps classification accuracy.
+
+Re-categorizes entries from the verified emails store with raw and with
+preprocessed bodies, and reports accuracy against the verified labels and
+the prompt tokens each variant used. Needs a configured LLM backend.
+
+Usage:
+    python benchmarks/eval_preprocessing.py --sample 100
+"""
+import argparse
+import os
+import random
+import sys
+
+# Add the current directory to sys.path to allow imports from src
+sys.path.append(os.getcwd())
+
+from src.llm_client import categorize_emails, configure_llm, estimate_tokens
+from src.preprocess import preprocess_body
+from src.verified_store import VERIFIED_STORE_FILE, VerifiedStore
+
+
+def load_examples(path):
+    examples = []
+    for entry in VerifiedStore(path):
+        if "metadata" not in entry:
+            continue
+        input_text = entry["training_data"].get("input", "")
+        body = input_text.split("Body:", 1)[1].strip() if "Body:" in input_text else ""
+        examples.append({
+            "subject": entry["metadata"].get("subject", ""),
+            "snippet": entry["metadata"].get("snippet", ""),
+            "body": body,
+            "label": entry["training_data"].get("output"),
+        })
+    return examples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sample", type=int, default=100, help="Number of verified emails to evaluate")
+    parser.add_argument("--file", default=VERIFIED_STORE_FILE)
+    args = parser.parse_args()
+
+    examples = load_examples(args.file)
+    random.Random(0).shuffle(examples)
+    examples = examples[:args.sample]
+    if not examples:
+        print(f"No verified emails found in {args.file}.")
+        return
+
+    configure_llm()
+    variants = {
+        "raw": examples,
+        "preprocessed": [{**e, "body": preprocess_body(e["body"])} for e in examples],
+    }
+    results = {}
+    for name, emails in variants.items():
+        print(f"\n--- {name} bodies ---")
+        predictions = categorize_emails(emails, batched=False)
+        correct = sum(p == e["label"] for p, e in zip(predictions, examples))
+        tokens = sum(estimate_tokens(e["body"]) for e in emails)
+        results[name] = (correct, tokens)
+
+    print(f"\n{'BODIES':<14} | {'ACCURACY':>8} | {'BODY TOKENS':>11}")
+    print("-" * 40)
+    for name, (correct, tokens) in results.items():
+        print(f"{name:<14} | {correct / len(examples):>8.1%} | {tokens:>11}")
+
+
+if __name__ == "__main__":
+    main()
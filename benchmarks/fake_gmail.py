@@ -0,0 +1,346 @@
+"""In-memory stand-in for the Gmail API service used by the benchmarks.
+
+Mimics the ``service.users().messages()...execute()`` call chain closely enough
+for gmail_client to run against it unchanged. Every HTTP round trip sleeps for
+``latency`` seconds, so batched and unbatched code paths can be compared
+without a network or a Gmail account.
+"""
+import base64
+import json
+import random
+import re
+import threading
+import time
+from collections import Counter
+
+import httplib2
+from googleapiclient.errors import HttpError
+
+from src.gmail_client import label_search_name
+
+WORDS = (
+    "order invoice shipping account meeting flight booking receipt update newsletter "
+    "payment offer discount ticket statement security notice project review team"
+).split()
+
+
+def _http_error(status, reason):
+    resp = httplib2.Response({"status": status})
+    resp.reason = reason
+    content = json.dumps({"error": {"code": status, "message": reason}}).encode()
+    return HttpError(resp, content)
+
+
+def make_message(index, body_size=2000, rng=None):
+    """Builds a raw Gmail message resource with a multipart text/plain + text/html body."""
+    rng = rng or random.Random(index)
+    text = " ".join(rng.choice(WORDS) for _ in range(body_size // 6 + 1))[:body_size]
+    html = f"<html><body><p>{text}</p></body></html>"
+    encode = lambda s: base64.urlsafe_b64encode(s.encode()).decode()
+    return {
+        "id": f"{index:016x}",
+        "threadId": f"{index:016x}",
+        "historyId": str(1000 + index),
+        "labelIds": ["INBOX", "UNREAD"],
+        "snippet": text[:100],
+        "payload": {
+            "mimeType": "multipart/alternative",
+            "headers": [
+                {"name": "Subject", "value": f"Your {rng.choice(WORDS)} #{index}"},
+                {"name": "From", "value": f"{rng.choice(WORDS)}@{rng.choice(WORDS)}.example.com"},
+                {"name": "To", "value": "me@example.com"},
+                {"name": "Date", "value": "Mon, 1 Jan 2024 00:00:00 +0000"},
+            ],
+            "body": {"size": 0},
+            "parts": [
+                {"mimeType": "text/plain", "body": {"size": len(text), "data": encode(text)}},
+                {"mimeType": "text/html", "body": {"size": len(html), "data": encode(html)}},
+            ],
+        },
+    }
+
+
+class FakeRequest:
+    """A deferred API call, like googleapiclient.http.HttpRequest."""
+
+    def __init__(self, service, method, fn):
+        self._service = service
+        self.method = method
+        self._fn = fn
+
+    def execute(self, http=None, num_retries=0):
+        start = time.perf_counter()
+        try:
+            self._service.round_trip(self.method)
+            response = self._fn()
+            self._service.sent(response)
+            return response
+        finally:
+            self._service.record_latency(time.perf_counter() - start)
+
+
+class FakeBatch:
+    """Collects requests and runs them in a single round trip, like BatchHttpRequest."""
+
+    def __init__(self, service, callback=None):
+        self._service = service
+        self._callback = callback
+        self._requests = []
+
+    def add(self, request, callback=None, request_id=None):
+        if len(self._requests) >= 100:
+            raise ValueError("Exceeded the maximum of 100 calls in a single batch.")
+        request_id = request_id or str(len(self._requests))
+        self._requests.append((request_id, request, callback or self._callback))
+
+    def execute(self, http=None):
+        start = time.perf_counter()
+        self._service.round_trip("batch")
+        results = []
+        for request_id, request, callback in self._requests:
+            self._service.count(request.method)
+            try:
+                response, exception = request._fn(), None
+                self._service.sent(response)
+            except HttpError as e:
+                response, exception = None, e
+            results.append((request_id, response, exception, callback))
+        # The whole batch response arrives before any callback runs
+        self._service.record_latency(time.perf_counter() - start)
+        for request_id, response, exception, callback in results:
+            if callback:
+                callback(request_id, response, exception)
+
+
+class _Messages:
+    def __init__(self, service):
+        self._service = service
+
+    def list(self, userId="me", q=None, maxResults=100, pageToken=None, **kwargs):
+        def run():
+            ids = self._service.message_ids
+            # Of Gmail's search syntax, only "-label:<name>" is understood
+            excluded = set(re.findall(r"-label:(\S+)", q or ""))
+            if excluded:
+                ids = self._service.ids_without_labels(excluded)
+            start = int(pageToken or 0)
+            end = start + min(maxResults, 500)
+            result = {"messages": [{"id": i, "threadId": i} for i in ids[start:end]]}
+            if end < len(ids):
+                result["nextPageToken"] = str(end)
+            return result
+        return FakeRequest(self._service, "messages.list", run)
+
+    def get(self, userId="me", id=None, **kwargs):
+        def run():
+            self._service.maybe_fail()
+            if id not in self._service.messages:
+                raise _http_error(404, "Requested entity was not found.")
+            message = self._service.messages[id]
+            if kwargs.get("format") == "metadata":
+                wanted = set(kwargs.get("metadataHeaders") or [])
+                headers = [h for h in message["payload"]["headers"] if not wanted or h["name"] in wanted]
+                return {
+                    "id": message["id"],
+                    "historyId": message["historyId"],
+                    "snippet": message["snippet"],
+                    "payload": {"headers": headers},
+                }
+            return message
+        return FakeRequest(self._service, "messages.get", run)
+
+    def modify(self, userId="me", id=None, body=None):
+        def run():
+            self._service.maybe_fail()
+            if id not in self._service.messages:
+                raise _http_error(404, "Requested entity was not found.")
+            self._service.modify_labels([id], body or {})
+            return self._service.messages[id]
+        return FakeRequest(self._service, "messages.modify", run)
+
+    def batchModify(self, userId="me", body=None):
+        def run():
+            ids = body.get("ids", [])
+            if len(ids) > 1000:
+                raise _http_error(400, "Too many ids: maximum is 1000.")
+            self._service.maybe_fail()
+            # Like Gmail, one bad ID fails the whole request.
+            if any(i not in self._service.messages for i in ids):
+                raise _http_error(400, "Invalid id value")
+            self._service.modify_labels(ids, body)
+            return ""
+        return FakeRequest(self._service, "messages.batchModify", run)
+
+
+class _Labels:
+    def __init__(self, service):
+        self._service = service
+
+    def list(self, userId="me"):
+        def run():
+            return {"labels": [dict(label) for label in self._service.labels.values()]}
+        return FakeRequest(self._service, "labels.list", run)
+
+    def create(self, userId="me", body=None):
+        def run():
+            name = body["name"]
+            if any(label["name"].lower() == name.lower() for label in self._service.labels.values()):
+                raise _http_error(409, "Label name exists or conflicts")
+            label = self._service.add_label(name)
+            return dict(label)
+        return FakeRequest(self._service, "labels.create", run)
+
+
+class _History:
+    def __init__(self, service):
+        self._service = service
+
+    def list(self, userId="me", startHistoryId=None, labelId=None, historyTypes=None,
+             maxResults=100, pageToken=None):
+        def run():
+            start = int(startHistoryId)
+            if start < self._service.oldest_history_id:
+                raise _http_error(404, "Requested entity was not found.")
+            records = [r for r in self._service.history if int(r["id"]) > start]
+            offset = int(pageToken or 0)
+            result = {
+                "history": records[offset:offset + maxResults],
+                "historyId": str(self._service.history_id),
+            }
+            if offset + maxResults < len(records):
+                result["nextPageToken"] = str(offset + maxResults)
+            return result
+        return FakeRequest(self._service, "history.list", run)
+
+
+class _Users:
+    def __init__(self, service):
+        self._service = service
+
+    def getProfile(self, userId="me"):
+        def run():
+            return {"emailAddress": "me@example.com", "historyId": str(self._service.history_id)}
+        return FakeRequest(self._service, "getProfile", run)
+
+    def history(self):
+        return _History(self._service)
+
+    def messages(self):
+        return _Messages(self._service)
+
+    def labels(self):
+        return _Labels(self._service)
+
+
+class FakeGmailService:
+    """Fake Gmail service holding ``num_messages`` generated messages.
+
+    ``latency`` is the simulated round-trip time of one HTTP request,
+    ``body_size`` the length of each message's text body (its HTML part is
+    a little larger), and ``error_rate`` the fraction of calls that fail
+    with a retryable 429. The duration of every HTTP request is recorded in
+    ``latencies``.
+    """
+
+    def __init__(self, num_messages=1000, body_size=2000, latency=0.05, error_rate=0.0, seed=0):
+        self.latency = latency
+        self.error_rate = error_rate
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.body_size = body_size
+        self.messages = {}
+        for i in range(num_messages):
+            message = make_message(i, body_size)
+            self.messages[message["id"]] = message
+        # Newest first, like messages.list
+        self.message_ids = list(reversed(self.messages))
+        self.history = []
+        self.history_id = 1000 + num_messages
+        self.oldest_history_id = 0
+        self.labels = {}
+        for name in ("INBOX", "UNREAD", "SENT", "SPAM", "TRASH"):
+            self.labels[name] = {"id": name, "name": name, "type": "system"}
+        self.calls = Counter()
+        self.round_trips = 0
+        self.bytes_sent = 0
+        self.latencies = []
+
+    def users(self):
+        return _Users(self)
+
+    def new_batch_http_request(self, callback=None):
+        return FakeBatch(self, callback)
+
+    def round_trip(self, method):
+        with self._lock:
+            self.round_trips += 1
+            if method != "batch":
+                self.calls[method] += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def record_latency(self, seconds):
+        with self._lock:
+            self.latencies.append(seconds)
+
+    def count(self, method):
+        with self._lock:
+            self.calls[method] += 1
+
+    def sent(self, response):
+        size = len(json.dumps(response))
+        with self._lock:
+            self.bytes_sent += size
+
+    def maybe_fail(self):
+        with self._lock:
+            failed = self.error_rate and self._rng.random() < self.error_rate
+        if failed:
+            raise _http_error(429, "Rate Limit Exceeded")
+
+    def deliver(self, count):
+        """Simulates count new messages arriving in the inbox."""
+        with self._lock:
+            for _ in range(count):
+                message = make_message(len(self.messages), self.body_size)
+                self.history_id += 1
+                message["historyId"] = str(self.history_id)
+                self.messages[message["id"]] = message
+                self.message_ids.insert(0, message["id"])
+                self.history.append({
+                    "id": str(self.history_id),
+                    "messagesAdded": [{"message": {"id": message["id"], "labelIds": message["labelIds"]}}],
+                })
+
+    def expire_history(self):
+        """Makes every historyId seen so far too old for history.list."""
+        self.oldest_history_id = self.history_id + 1
+
+    def add_label(self, name):
+        with self._lock:
+            label_id = f"Label_{len(self.labels)}"
+            label = {"id": label_id, "name": name, "type": "user"}
+            self.labels[label_id] = label
+        return label
+
+    def ids_without_labels(self, search_names):
+        """Message IDs carrying none of the labels named (in search form)."""
+        with self._lock:
+            label_ids = {i for i, label in self.labels.items() if label_search_name(label["name"]) in search_names}
+            return [i for i in self.message_ids if not label_ids & set(self.messages[i]["labelIds"])]
+
+    def modify_labels(self, message_ids, body):
+        add = set(body.get("addLabelIds", []))
+        remove = set(body.get("removeLabelIds", []))
+        with self._lock:
+            for message_id in message_ids:
+                message = self.messages[message_id]
+                labels = (set(message["labelIds"]) | add) - remove
+                message["labelIds"] = sorted(labels)
+
+    def reset_counters(self):
+        with self._lock:
+            self.calls.clear()
+            self.round_trips = 0
+            self.bytes_sent = 0
+            self.latencies = []
@@ -0,0 +1,158 @@
+"""Local stand-in for an OpenAI-compatible LLM server, used by the benchmarks.
+
+Serves ``/v1/models`` and ``/v1/chat/completions`` closely enough for
+llm_client's ``local_openai`` backend to run against it unchanged. Each
+completion waits ``latency`` seconds, plus the prompt length divided by
+``prefill_rate`` (tokens per second) when set, then answers with one of the
+categories listed in the system prompt, picked from a hash of the email.
+
+Run it on its own to point the organizer at it:
+    python benchmarks/fake_llm_server.py --port 1234 --latency 0.2
+with USE_LOCAL_LLM=true and LOCAL_LLM_API=openai in .env.
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Add the current directory to sys.path to allow imports from src
+sys.path.append(os.getcwd())
+
+from src.llm_client import estimate_tokens, parse_categories
+
+_BATCH_RE = re.compile(r"Categorize each of the (\d+) emails")
+FALLBACK_CATEGORIES = ["Updates & Content", "Finance & Payments", "Shopping & E-Commerce"]
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        server = self.server.fake
+        if self.path.rstrip("/") == "/v1/models":
+            self._send(200, {"object": "list", "data": [server.model_info()]})
+        elif self.path == f"/v1/models/{server.model}":
+            self._send(200, server.model_info())
+        else:
+            self._send(404, {"error": {"message": f"Unknown path {self.path}"}})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        if self.path != "/v1/chat/completions":
+            self._send(404, {"error": {"message": f"Unknown path {self.path}"}})
+            return
+        self._send(200, self.server.fake.complete(request))
+
+
+class FakeLLMServer:
+    """OpenAI-compatible server on a background thread; ``base_url`` is its API root.
+
+    ``port=0`` picks a free port. Use as a context manager, or call start()
+    and stop(). ``requests`` counts the completions served.
+    """
+
+    def __init__(self, latency=0.2, prefill_rate=0, model="fake-model", context_length=8192, port=0):
+        self.latency = latency
+        self.prefill_rate = prefill_rate
+        self.model = model
+        self.context_length = context_length
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", port), _Handler)
+        self._httpd.daemon_threads = True
+        self._httpd.fake = self
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self._httpd.server_address[1]}/v1"
+
+    def serve_forever(self):
+        self._httpd.serve_forever()
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def model_info(self):
+        return {"id": self.model, "object": "model", "owned_by": "benchmark", "context_length": self.context_length}
+
+    def complete(self, request):
+        messages = request.get("messages", [])
+        system = "\n".join(m["content"] for m in messages if m.get("role") == "system")
+        prompt = "\n".join(m["content"] for m in messages if m.get("role") != "system")
+        categories = parse_categories(system) or FALLBACK_CATEGORIES
+        pick = lambda text: categories[zlib.crc32(text.encode()) % len(categories)]
+
+        batch = _BATCH_RE.search(prompt)
+        if batch:
+            blocks = re.split(r"^### Email \d+\n", prompt, flags=re.MULTILINE)[1:]
+            content = json.dumps({str(n): pick(block) for n, block in enumerate(blocks, 1)})
+        else:
+            content = pick(prompt)
+
+        prompt_tokens = estimate_tokens(system) + estimate_tokens(prompt)
+        delay = self.latency + (prompt_tokens / self.prefill_rate if self.prefill_rate else 0)
+        if delay:
+            time.sleep(delay)
+        with self._lock:
+            self.requests += 1
+        completion_tokens = estimate_tokens(content)
+        return {
+            "id": f"chatcmpl-{self.requests}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": self.model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=1234)
+    parser.add_argument("--latency", type=float, default=0.2, help="Seconds per completion")
+    parser.add_argument("--prefill-rate", type=float, default=0, help="Prompt tokens per second (0 = instant)")
+    parser.add_argument("--context-length", type=int, default=8192)
+    args = parser.parse_args()
+
+    server = FakeLLMServer(args.latency, args.prefill_rate, context_length=args.context_length, port=args.port)
+    print(f"Fake LLM server listening at {server.base_url} (Ctrl+C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
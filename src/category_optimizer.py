@@ -1,25 +1,94 @@
+import json
 import os
 import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 
 # Add current directory to path
 sys.path.append(os.getcwd())
 
-from src.gmail_client import authenticate, fetch_emails
-from src.llm_client import configure_llm
+from src.gmail_client import authenticate, fetch_emails, find_message_ids, iter_emails
+from src.llm_client import DEFAULT_RATE_LIMITS, RateLimiter, configure_llm, estimate_tokens
 
-def suggest_categories_with_llm(emails):
-    """Uses Gemini to suggest email categories (always uses Gemini for best results)."""
+OPTIMIZER_MODEL = "gemini-2.5-flash"
+# Up to this many emails are analyzed in a single prompt; larger samples
+# go through map-reduce discovery
+SINGLE_PROMPT_MAX_EMAILS = 200
+# Email-list tokens per map call. Smaller chunks mean more, faster calls
+# that run in parallel; each email line is capped at MAX_LINE_CHARS.
+MAP_CHUNK_TOKENS = 20000
+MAX_LINE_CHARS = 300
+# Candidate-list tokens per reduce call; more candidates than this are
+# merged in rounds, at most MAX_MERGE_ROUNDS of them
+REDUCE_CHUNK_TOKENS = 20000
+MAX_MERGE_ROUNDS = 5
+DEFAULT_MAP_CONCURRENCY = 8
+
+MAP_PROMPT = """Below are {count} emails from a user's inbox, one per line.
+Propose up to 12 distinct topic categories that cover them. Group entire topics together rather than splitting by status (e.g. order confirmations, shipping updates and review requests are all "Shopping").
+
+Respond with ONLY a JSON array of objects with keys "name", "description" and "count" (how many of these emails belong to it), for example:
+[{{"name": "Shopping", "description": "Orders, shipping and returns", "count": 12}}]
+
+Emails:
+{emails}"""
+
+MERGE_PROMPT = """Below are candidate email categories proposed for different parts of one inbox, with the number of emails each covered.
+Merge duplicates and near-duplicates into at most 20 distinct categories, summing their counts.
+
+Respond with ONLY a JSON array of objects with keys "name", "description" and "count".
+
+Candidates:
+{candidates}"""
+
+REDUCE_PROMPT = """I analyzed {total} emails from a user's inbox in {chunks} parts. Below are the candidate categories found across all parts, with the number of emails each covered.
+Merge them into a set of 5-8 distinct, mutually exclusive categories that would best organize this specific inbox. Favour categories that cover many emails; fold small ones into broader categories.
+
+The current categories are: Work, Personal, Promotions, Social, Updates, Spam.
+
+If the current categories are good, say so. If they can be improved, please suggest the new list.
+
+**Important:** Group entire topics together rather than splitting by status.
+(e.g., 'Order Confirmation', 'Shipping Update', and 'Review Request' should all go into one 'Shopping' category).
+
+Provide the output in this format:
+
+### Analysis
+(Brief analysis of the email types found)
+
+### Suggested Categories
+- Category 1: Description
+- Category 2: Description
+...
+
+Candidates:
+{candidates}"""
+
+_rate_limiter = None
+
+def _get_gemini_client():
     from google import genai
     from dotenv import load_dotenv
-    
+
     load_dotenv()
-    
+
     # Always use Gemini for category optimization (we want the best model for this)
     api_key = os.getenv("GEMINI_API_KEY")
     if not api_key:
         raise ValueError("GEMINI_API_KEY not found. Category optimization requires Gemini.")
-    
-    client = genai.Client(api_key=api_key)
+    return genai.Client(api_key=api_key)
+
+def _get_rate_limiter():
+    """Returns the Gemini rate limiter shared by the parallel discovery calls."""
+    global _rate_limiter
+    if _rate_limiter is None:
+        rpm, tpm = DEFAULT_RATE_LIMITS["gemini"]
+        _rate_limiter = RateLimiter(int(os.getenv("LLM_RPM", rpm)) or None, int(os.getenv("LLM_TPM", tpm)) or None)
+    return _rate_limiter
+
+def suggest_categories_with_llm(emails):
+    """Uses Gemini to suggest email categories (always uses Gemini for best results)."""
+    client = _get_gemini_client()
     print("Using Gemini for category optimization...")
 
     # Prepare a summary of emails
@@ -54,24 +123,154 @@ def suggest_categories_with_llm(emails):
 
     print("Analyzing emails with Gemini...")
     response = client.models.generate_content(
-        model="gemini-2.5-flash",
+        model=OPTIMIZER_MODEL,
         contents=prompt
     )
     return response.text
 
+def email_line(email):
+    """One line describing an email for the discovery prompts."""
+    line = f"Subject: {email['subject']} | Sender: {email['sender']} | Snippet: {email['snippet']}"
+    return " ".join(line.split())[:MAX_LINE_CHARS]
+
+def chunk_lines(lines, max_tokens):
+    """Groups lines into lists of at most max_tokens (estimated) each, lazily."""
+    chunk = []
+    tokens = 0
+    for line in lines:
+        line_tokens = estimate_tokens(line)
+        if chunk and tokens + line_tokens > max_tokens:
+            yield chunk
+            chunk, tokens = [], 0
+        chunk.append(line)
+        tokens += line_tokens
+    if chunk:
+        yield chunk
+
+def _parse_candidates(text):
+    """Returns the [{"name", "description", "count"}] list from a JSON reply, skipping bad entries."""
+    start, end = text.find("["), text.rfind("]")
+    if start == -1 or end < start:
+        return []
+    try:
+        data = json.loads(text[start:end + 1])
+    except json.JSONDecodeError:
+        return []
+    candidates = []
+    for item in data if isinstance(data, list) else []:
+        if not isinstance(item, dict) or not str(item.get("name") or "").strip():
+            continue
+        try:
+            count = max(0, int(item.get("count") or 0))
+        except (TypeError, ValueError):
+            count = 0
+        candidates.append({
+            "name": str(item["name"]).strip("*").strip(),
+            "description": str(item.get("description") or "").strip(),
+            "count": count,
+        })
+    return candidates
+
+def _generate(client, prompt, json_output=False):
+    _get_rate_limiter().acquire(estimate_tokens(prompt))
+    config = {"response_mime_type": "application/json"} if json_output else None
+    return client.models.generate_content(model=OPTIMIZER_MODEL, contents=prompt, config=config).text
+
+def _candidate_lines(candidates):
+    return [f"- {c['name']} ({c['count']} emails): {c['description']}" for c in candidates]
+
+def map_chunk(client, lines):
+    """Asks for candidate categories covering one chunk of email lines."""
+    try:
+        return _parse_candidates(_generate(
+            client, MAP_PROMPT.format(count=len(lines), emails="\n".join(lines)), json_output=True
+        ))
+    except Exception as e:
+        print(f"Error analyzing a chunk of {len(lines)} emails: {e}")
+        return []
+
+def merge_group(client, group):
+    """Merges one group of candidates, keeping them as they are if the call fails."""
+    try:
+        merged = _parse_candidates(_generate(
+            client, MERGE_PROMPT.format(candidates="\n".join(_candidate_lines(group))), json_output=True
+        ))
+    except Exception as e:
+        print(f"Error merging a group of {len(group)} candidate categories: {e}")
+        return group
+    # An unusable reply must not drop the group's categories
+    return merged or group
+
+def merge_candidates(client, candidates):
+    """Merges candidate lists in rounds until they fit one reduce call."""
+    for _ in range(MAX_MERGE_ROUNDS):
+        groups = []
+        for lines in chunk_lines(_candidate_lines(candidates), REDUCE_CHUNK_TOKENS):
+            start = sum(len(group) for group in groups)
+            groups.append(candidates[start:start + len(lines)])
+        if len(groups) <= 1:
+            break
+        print(f"Merging {len(candidates)} candidate categories in {len(groups)} groups...")
+        with ThreadPoolExecutor(max_workers=int(os.getenv("OPTIMIZER_CONCURRENCY", DEFAULT_MAP_CONCURRENCY))) as executor:
+            merged = [candidate for group in executor.map(lambda group: merge_group(client, group), groups)
+                      for candidate in group]
+        if len(merged) >= len(candidates):
+            # Every merge failed; another round would only repeat them
+            break
+        candidates = merged
+    return candidates
+
+def suggest_categories_map_reduce(emails, total=None):
+    """Suggests email categories from any number of emails with map-reduce.
+
+    emails may be any iterable (e.g. a generator over iter_emails chunks);
+    only one line per email is kept, and only until its chunk is sent. Map:
+    the lines are chunked to MAP_CHUNK_TOKENS and each chunk is summarized
+    into candidate categories with email counts, up to OPTIMIZER_CONCURRENCY
+    (.env) calls at a time. Reduce: the candidates are merged, in rounds if
+    they don't fit one call, into the same analysis and category list that
+    suggest_categories_with_llm returns.
+    """
+    client = _get_gemini_client()
+    concurrency = int(os.getenv("OPTIMIZER_CONCURRENCY", DEFAULT_MAP_CONCURRENCY))
+    print(f"Using Gemini for map-reduce category discovery ({concurrency} parallel calls)...")
+
+    start = time.perf_counter()
+    candidates = []
+    chunks = emails_seen = 0
+    in_flight = set()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        def collect(done):
+            for future in done:
+                candidates.extend(future.result())
+
+        for lines in chunk_lines((email_line(email) for email in emails), MAP_CHUNK_TOKENS):
+            # Keep at most two chunks per worker waiting, so memory stays bounded
+            if len(in_flight) >= concurrency * 2:
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                collect(done)
+            in_flight.add(executor.submit(map_chunk, client, lines))
+            chunks += 1
+            emails_seen += len(lines)
+            print(f"Analyzing chunk {chunks} ({emails_seen}{f'/{total}' if total else ''} emails)...")
+        collect(wait(in_flight)[0])
+
+    print(f"Map: {len(candidates)} candidate categories from {chunks} chunks in {time.perf_counter() - start:.1f}s")
+    if not candidates:
+        raise ValueError("No candidate categories were found.")
+
+    candidates = merge_candidates(client, candidates)
+    candidates.sort(key=lambda c: c["count"], reverse=True)
+    print("Merging candidates into the final categories...")
+    suggestion = _generate(client, REDUCE_PROMPT.format(
+        total=emails_seen, chunks=chunks, candidates="\n".join(_candidate_lines(candidates))
+    ))
+    print(f"Category discovery over {emails_seen} emails took {time.perf_counter() - start:.1f}s")
+    return suggestion
+
 def generate_prompt_content(analysis):
     """Generates the actual system prompt content based on the analysis."""
-    from google import genai
-    from dotenv import load_dotenv
-    
-    load_dotenv()
-    
-    # Always use Gemini for prompt generation
-    api_key = os.getenv("GEMINI_API_KEY")
-    if not api_key:
-        raise ValueError("GEMINI_API_KEY not found")
-    
-    client = genai.Client(api_key=api_key)
+    client = _get_gemini_client()
     
     prompt = f"""
     You are an expert prompt engineer. 
@@ -97,7 +296,7 @@ def generate_prompt_content(analysis):
     
     print("Generating optimized prompt...")
     response = client.models.generate_content(
-        model="gemini-2.5-flash",
+        model=OPTIMIZER_MODEL,
         contents=prompt
     )
     # Clean up potential markdown code blocks if the model adds them
@@ -113,14 +312,30 @@ def main():
     configure_llm()
     service = authenticate()
     
-    print("Fetching last 200 emails...")
-    emails = fetch_emails(service, query="is:inbox", max_results=200)
+    try:
+        num_emails = int(input(f"How many emails to analyze? (default {SINGLE_PROMPT_MAX_EMAILS}): ") or SINGLE_PROMPT_MAX_EMAILS)
+    except ValueError:
+        num_emails = SINGLE_PROMPT_MAX_EMAILS
     
-    if not emails:
-        print("No emails found.")
-        return
+    print(f"Fetching last {num_emails} emails...")
+    if num_emails <= SINGLE_PROMPT_MAX_EMAILS:
+        # Only subject, sender and snippet are used, so skip downloading bodies
+        emails = fetch_emails(service, query="is:inbox", max_results=num_emails, projection="metadata")
+        
+        if not emails:
+            print("No emails found.")
+            return
 
-    suggestion = suggest_categories_with_llm(emails)
+        suggestion = suggest_categories_with_llm(emails)
+    else:
+        message_ids = find_message_ids(service, query="is:inbox", max_results=num_emails)
+        if not message_ids:
+            print("No emails found.")
+            return
+        
+        # Emails are analyzed as they are downloaded, a chunk at a time
+        emails = (email for chunk in iter_emails(service, message_ids, projection="metadata") for email in chunk)
+        suggestion = suggest_categories_map_reduce(emails, total=len(message_ids))
     print("\n" + "="*50 + "\n")
     print(suggestion)
     print("\n" + "="*50 + "\n")
@@ -1,29 +1,118 @@
 import streamlit as st
+import copy
 import json
 import pandas as pd
 import os
+import sys
+
+# Add the current directory to sys.path to allow imports from src
+sys.path.append(os.getcwd())
+
+from src.review_journal import (
+    COMPACT_AFTER, append_patches, apply_patches, compact_in_background, read_patches, save_json_patches,
+)
+from src.verified_store import VERIFIED_STORE_FILE, get_verified_store, normalize_entry
 
-VERIFIED_EMAILS_FILE = "data/verified_emails.json"
 REVIEWED_FILE = "data/verified_emails_reviewed.json"
 ORGANIZER_FILE = "data/pending_organization.json"
 PROMPT_FILE = "prompts/categorize_email_prompt.md"
 
-def load_data(file_path):
-    if os.path.exists(file_path):
+def _file_version(file_path):
+    """Changes when the dataset itself is written, but not when edits are journaled."""
+    paths = [file_path, file_path + "-wal"] if file_path == VERIFIED_STORE_FILE else [file_path]
+    return tuple(os.stat(path).st_mtime_ns if os.path.exists(path) else None for path in paths)
+
+# Cached as shared resources rather than cache_data, which would copy the
+# whole dataset on every rerun; callers must not modify what these return
+@st.cache_resource(show_spinner="Loading data...")
+def _load_base(file_path, version):
+    if file_path == VERIFIED_STORE_FILE:
+        data = list(get_verified_store())
+    elif os.path.exists(file_path):
         with open(file_path, "r") as f:
             data = json.load(f)
-            # Clean categories on load (remove markdown formatting like **)
-            for entry in data:
-                if "training_data" in entry and "output" in entry["training_data"]:
-                    cat = entry["training_data"]["output"]
-                    if cat:
-                        entry["training_data"]["output"] = cat.strip("*").strip()
-            return data
-    return []
+    else:
+        return []
+    # Clean categories on load (remove markdown formatting like **)
+    for entry in data:
+        if "training_data" in entry and "output" in entry["training_data"]:
+            cat = entry["training_data"]["output"]
+            if cat:
+                entry["training_data"]["output"] = cat.strip("*").strip()
+    return data
+
+def load_data(file_path):
+    """Loads a dataset (parsed once per file version) with its journaled edits applied.
+
+    The list is shared between reruns; copy an entry before modifying it.
+    """
+    data = _load_base(file_path, _file_version(file_path))
+    patches = read_patches(file_path)
+    if patches:
+        # Patch a copy of the list; the cached entries themselves stay untouched
+        data = apply_patches(list(data), patches)
+    return data
+
+def _write_patches(file_path, patches):
+    if file_path == VERIFIED_STORE_FILE:
+        get_verified_store().update_many(patches.values())
+    else:
+        save_json_patches(file_path, patches)
+
+def save_entries(file_path, patches):
+    """Saves edited entries ({index: entry}) to the dataset's journal.
+
+    Once enough edits pile up they are written to the dataset itself on a
+    background thread.
+    """
+    if append_patches(file_path, patches) >= COMPACT_AFTER:
+        compact_in_background(file_path, lambda journaled: _write_patches(file_path, journaled))
+
+TABLE_COLUMNS = ["Index", "Subject", "Sender", "Prediction", "Correct Label", "Thumbs Up"]
+PAGE_SIZES = [25, 50, 100, 200]
+
+def _table_row(i, entry):
+    metadata = entry.get("metadata", {})
+    training = entry.get("training_data", {})
+    
+    # Fallback for old format if any
+    if not metadata:
+        metadata = {
+            "subject": entry.get("subject"),
+            "sender": entry.get("sender", "Unknown"),
+            "model_prediction": entry.get("llm_prediction"),
+            "thumbs_up": entry.get("thumbs_up")
+        }
+        training = {
+            "output": entry.get("user_label")
+        }
+
+    return [
+        i,
+        metadata.get("subject"),
+        metadata.get("sender"),
+        metadata.get("model_prediction"),
+        training.get("output"),
+        bool(metadata.get("thumbs_up")),
+    ]
 
-def save_data(data, file_path):
-    with open(file_path, "w") as f:
-        json.dump(data, f, indent=4)
+@st.cache_resource(show_spinner="Indexing table...")
+def _load_table(file_path, version):
+    """One row of summary columns per entry, used to filter and sort the table view."""
+    rows = [_table_row(i, entry) for i, entry in enumerate(_load_base(file_path, version))]
+    return pd.DataFrame(rows, columns=TABLE_COLUMNS)
+
+def load_table(file_path):
+    """The table index with journaled edits applied to the affected rows."""
+    table = _load_table(file_path, _file_version(file_path))
+    patches = read_patches(file_path)
+    if patches:
+        rows = [_table_row(i, entry) for i, entry in patches.items() if i < len(table)]
+        if rows:
+            patched = pd.DataFrame(rows, columns=TABLE_COLUMNS).set_index("Index", drop=False)
+            table = table.copy()
+            table.loc[patched.index, TABLE_COLUMNS] = patched
+    return table
 
 def load_categories():
     """Extracts categories from the prompt file."""
@@ -53,7 +142,7 @@ dataset_option = st.sidebar.radio(
 
 if dataset_option == "Verified Emails":
     # Prefer reviewed file for verified emails
-    current_file = REVIEWED_FILE if os.path.exists(REVIEWED_FILE) else VERIFIED_EMAILS_FILE
+    current_file = REVIEWED_FILE if os.path.exists(REVIEWED_FILE) else VERIFIED_STORE_FILE
     st.sidebar.info(f"Editing: {current_file}")
 else:
     current_file = ORGANIZER_FILE
@@ -66,42 +155,8 @@ categories = load_categories()
 if not data:
     st.warning("No data found.")
 else:
-    # Convert to DataFrame for easier handling in Streamlit, but we'll edit the original list
-    # We need to flatten the structure slightly for the table view
-    
-    # Session state to track changes if needed, but direct edit is simpler for now
-    
     st.write(f"Total Entries: {len(data)}")
     
-    # Create a list of dicts for the dataframe
-    table_data = []
-    for i, entry in enumerate(data):
-        metadata = entry.get("metadata", {})
-        training = entry.get("training_data", {})
-        
-        # Fallback for old format if any
-        if not metadata:
-            metadata = {
-                "subject": entry.get("subject"),
-                "sender": entry.get("sender", "Unknown"),
-                "model_prediction": entry.get("llm_prediction"),
-                "thumbs_up": entry.get("thumbs_up")
-            }
-            training = {
-                "output": entry.get("user_label")
-            }
-
-        table_data.append({
-            "Index": i,
-            "Subject": metadata.get("subject"),
-            "Sender": metadata.get("sender"),
-            "Prediction": metadata.get("model_prediction"),
-            "Correct Label": training.get("output"),
-            "Thumbs Up": metadata.get("thumbs_up")
-        })
-    
-    df = pd.DataFrame(table_data)
-    
     # Display interactive table
     # We use data_editor to allow quick edits, but syncing back to JSON requires care
     # For now, let's do a row-by-row review mode which is safer and more detailed
@@ -116,7 +171,7 @@ else:
         idx = st.session_state.current_index
         
         if 0 <= idx < len(data):
-            entry = data[idx]
+            entry = copy.deepcopy(data[idx])
             
             # Normalize data if needed (handle old format)
             if "metadata" not in entry:
@@ -199,8 +254,7 @@ else:
                     training["output"] = new_label
                     entry["training_data"] = training
                     entry["metadata"] = metadata
-                    data[idx] = entry
-                    save_data(data, current_file)
+                    save_entries(current_file, {idx: entry})
                     st.success("Saved!")
                     
                     # Move to next
@@ -228,6 +282,47 @@ else:
 
     with tab2:
         st.write("Edit the data directly in the table below. Don't forget to click 'Save Changes'!")
+        table = load_table(current_file)
+        
+        # Filters and sorting run on the whole table; only the current page is shown
+        f1, f2, f3, f4 = st.columns(4)
+        with f1:
+            sender_filter = st.text_input("Sender contains")
+        with f2:
+            prediction_filter = st.multiselect("Prediction", sorted(table["Prediction"].dropna().unique()))
+        with f3:
+            label_filter = st.multiselect("Correct Label", sorted(table["Correct Label"].dropna().unique()))
+        with f4:
+            thumbs_filter = st.selectbox("Thumbs Up", ["All", "Yes", "No"])
+        
+        mask = pd.Series(True, index=table.index)
+        if sender_filter:
+            mask &= table["Sender"].fillna("").str.contains(sender_filter, case=False, regex=False)
+        if prediction_filter:
+            mask &= table["Prediction"].isin(prediction_filter)
+        if label_filter:
+            mask &= table["Correct Label"].isin(label_filter)
+        if thumbs_filter != "All":
+            mask &= table["Thumbs Up"] == (thumbs_filter == "Yes")
+        view = table[mask]
+        
+        s1, s2, s3, s4 = st.columns(4)
+        with s1:
+            sort_column = st.selectbox("Sort by", TABLE_COLUMNS)
+        with s2:
+            descending = st.checkbox("Descending")
+        with s3:
+            page_size = st.selectbox("Rows per page", PAGE_SIZES, index=1)
+        page_count = max(1, -(-len(view) // page_size))
+        # Filtering can leave the remembered page past the end
+        if st.session_state.get("table_page", 1) > page_count:
+            st.session_state.table_page = page_count
+        with s4:
+            page = st.number_input(f"Page (of {page_count})", min_value=1, max_value=page_count, key="table_page")
+        
+        view = view.sort_values(sort_column, ascending=not descending, na_position="last", kind="stable")
+        page_df = view.iloc[(page - 1) * page_size:page * page_size]
+        st.caption(f"Showing {len(page_df)} of {len(view)} matching entries")
         
         # Configure column config for better editing experience
         column_config = {
@@ -246,25 +341,31 @@ else:
             )
         }
         
+        # A new key per page/filter, so edits don't leak onto other rows
+        editor_key = f"data_editor_{page}_{page_size}_{sort_column}_{descending}_{hash((sender_filter, tuple(prediction_filter), tuple(label_filter), thumbs_filter))}"
         edited_df = st.data_editor(
-            df,
+            page_df,
             column_config=column_config,
             use_container_width=True,
             hide_index=True,
-            key="data_editor"
+            key=editor_key
         )
         
         if st.button("Save Table Changes"):
-            # Update the original data list from the edited dataframe
-            for index, row in edited_df.iterrows():
-                original_idx = row["Index"]
-                
-                # Update metadata
-                data[original_idx]["metadata"]["thumbs_up"] = row["Thumbs Up"]
-                
-                # Update label
-                data[original_idx]["training_data"]["output"] = row["Correct Label"]
+            # Only write back rows whose label or thumbs-up actually changed;
+            # a label that is missing before and after is not a change
+            changed = pd.Series(False, index=page_df.index)
+            for column in ["Correct Label", "Thumbs Up"]:
+                before, after = page_df[column], edited_df[column]
+                changed |= before.ne(after) & ~(before.isna() & after.isna())
+            patches = {}
+            for original_idx, label, thumbs_up in edited_df.loc[changed, ["Index", "Correct Label", "Thumbs Up"]].itertuples(index=False):
+                entry = copy.deepcopy(normalize_entry(data[original_idx]))
+                entry["metadata"]["thumbs_up"] = bool(thumbs_up)
+                entry["training_data"]["output"] = label
+                patches[int(original_idx)] = entry
                 
-            save_data(data, current_file)
-            st.success("All changes saved to file!")
+            if patches:
+                save_entries(current_file, patches)
+            st.success(f"Saved {len(patches)} changed rows!")
             st.rerun()
@@ -1,4 +1,3 @@
-import json
 import os
 import sys
 
@@ -7,18 +6,9 @@ sys.path.append(os.getcwd())
 
 from src.gmail_client import authenticate, fetch_emails
 from src.llm_client import configure_llm, categorize_email
-
-VERIFIED_EMAILS_FILE = "data/verified_emails.json"
-
-def load_dataset():
-    if os.path.exists(VERIFIED_EMAILS_FILE):
-        with open(VERIFIED_EMAILS_FILE, "r") as f:
-            return json.load(f)
-    return []
-
-def save_dataset(data):
-    with open(VERIFIED_EMAILS_FILE, "w") as f:
-        json.dump(data, f, indent=4)
+from src.preprocess import preprocess_body, preprocessing_enabled
+from src.vector_classifier import update_vector_index
+from src.verified_store import get_verified_store
 
 def main():
     print("--- Gmail Organizer Dataset Builder ---")
@@ -35,18 +25,12 @@ def main():
     
     # Fetch emails
     print("Fetching emails...")
-    # Changed query to 'is:inbox' to get recent emails, not just unread ones
-    emails = fetch_emails(service, query="is:inbox", max_results=10) 
-    
-    dataset = load_dataset()
+    # Old flat-format entries are converted when the store migrates them
+    dataset = get_verified_store()
+    existing_ids = dataset.ids()
     
-    # Handle both old (flat) and new (nested) formats for duplicate checking
-    existing_ids = set()
-    for item in dataset:
-        if "metadata" in item:
-            existing_ids.add(item["metadata"]["email_id"])
-        else:
-            existing_ids.add(item.get("email_id") or item.get("id"))
+    # Changed query to 'is:inbox' to get recent emails, not just unread ones
+    emails = fetch_emails(service, query="is:inbox", max_results=10, exclude_ids=existing_ids) 
     
     new_entries = 0
     
@@ -62,7 +46,8 @@ def main():
         print(f"{'='*50}")
         
         # Get LLM Label
-        predicted_category = categorize_email(email["subject"], email["snippet"], email["body"])
+        llm_body = preprocess_body(email["body"]) if preprocessing_enabled() else email["body"]
+        predicted_category = categorize_email(email["subject"], email["snippet"], llm_body)
         print(f"LLM Prediction: {predicted_category}")
         
         # User Review
@@ -98,12 +83,13 @@ def main():
                     "thumbs_up": predicted_category == correct_category
                 }
             }
-            dataset.append(entry)
+            # Saved right away, so an interrupted session keeps what was reviewed
+            dataset.add(entry)
             new_entries += 1
             
     if new_entries > 0:
-        save_dataset(dataset)
-        print(f"\nSaved {new_entries} new verified entries to {VERIFIED_EMAILS_FILE}")
+        print(f"\nSaved {new_entries} new verified entries to {dataset.path}")
+        update_vector_index()
     else:
         print("\nNo new entries added.")
 
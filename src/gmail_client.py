@@ -1,45 +1,181 @@
 import os.path
 import base64
+import json
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from google.auth.transport.requests import Request
 from google.oauth2.credentials import Credentials
+from google_auth_httplib2 import AuthorizedHttp
 from google_auth_oauthlib.flow import InstalledAppFlow
 from googleapiclient.discovery import build
+from googleapiclient.errors import HttpError
+from googleapiclient.http import build_http
 from email.message import EmailMessage
+from src import metrics
+from src.message_store import get_message_store
 
 # If modifying these scopes, delete the file token.json.
 SCOPES = ["https://www.googleapis.com/auth/gmail.modify"]
 
-def create_label(service, label_name):
-    """Creates a new label with the given name."""
+# Gmail accepts up to 100 calls per batch request, but recommends 50 or fewer
+# to stay clear of per-user rate limits.
+BATCH_SIZE = 50
+MAX_BATCHES_IN_FLIGHT = 4
+BATCH_MAX_RETRIES = 3
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+# messages.get parameters for each fetch_emails projection. "metadata" only
+# transfers the headers we parse plus the snippet, and skips body decoding.
+PROJECTIONS = {
+    "full": {"format": "full"},
+    "metadata": {
+        "format": "metadata",
+        "metadataHeaders": ["Subject", "From", "To"],
+        "fields": "id,historyId,snippet,payload/headers",
+    },
+}
+# messages.batchModify accepts at most 1000 message IDs per call.
+BATCH_MODIFY_MAX_IDS = 1000
+
+_thread_local = threading.local()
+
+# Label index persistence. Set LABEL_CACHE_TTL (seconds) in .env to keep the
+# label list on disk between runs; 0 keeps it in memory for the session only.
+LABEL_CACHE_FILE = "data/label_cache.json"
+
+# Last seen mailbox historyId for incremental inbox sync.
+SYNC_STATE_FILE = "data/sync_state.json"
+
+# Hidden label the organizer adds to every message it has labeled, so later
+# runs can exclude them in the Gmail query. Override with PROCESSED_LABEL in
+# .env; an empty value turns the marker off.
+DEFAULT_PROCESSED_LABEL = "Organizer/Processed"
+
+_label_index = None
+
+class LabelIndex:
+    """Case-insensitive label name to ID lookup for one Gmail account.
+
+    The label list is fetched with a single labels.list call the first time
+    it is needed and kept up to date as labels are created. When ttl is
+    positive the index is also saved to cache_file and reused by later runs
+    until it is older than ttl seconds.
+    """
+
+    def __init__(self, service, cache_file=LABEL_CACHE_FILE, ttl=None):
+        self.service = service
+        self.cache_file = cache_file
+        self.ttl = int(os.getenv("LABEL_CACHE_TTL", "0")) if ttl is None else ttl
+        self._ids = None
+
+    def _load_from_disk(self):
+        if self.ttl <= 0 or not os.path.exists(self.cache_file):
+            return None
+        try:
+            with open(self.cache_file, "r") as f:
+                cached = json.load(f)
+            if time.time() - cached["fetched_at"] > self.ttl:
+                return None
+            return cached["labels"]
+        except Exception as e:
+            print(f"Warning: Could not read label cache {self.cache_file}: {e}")
+            return None
+
+    def _save_to_disk(self):
+        if self.ttl <= 0:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.cache_file) or ".", exist_ok=True)
+            tmp_file = self.cache_file + ".tmp"
+            with open(tmp_file, "w") as f:
+                json.dump({"fetched_at": time.time(), "labels": self._ids}, f)
+            os.replace(tmp_file, self.cache_file)
+        except Exception as e:
+            print(f"Warning: Could not write label cache {self.cache_file}: {e}")
+
+    def refresh(self):
+        """Reloads the index from Gmail with one labels.list call."""
+        results = _execute(self.service.users().labels().list(userId="me"))
+        self._ids = {label["name"].lower(): label["id"] for label in results.get("labels", [])}
+        self._save_to_disk()
+
+    def get(self, label_name):
+        """Returns the ID of the label named label_name, or None."""
+        if self._ids is None:
+            self._ids = self._load_from_disk()
+            if self._ids is None:
+                self.refresh()
+        return self._ids.get(label_name.lower())
+
+    def add(self, label_name, label_id):
+        """Records a label created during this session."""
+        if self._ids is None:
+            self.get(label_name)
+        self._ids[label_name.lower()] = label_id
+        self._save_to_disk()
+
+def get_label_index(service):
+    """Returns the session-wide LabelIndex for service."""
+    global _label_index
+    if _label_index is None or _label_index.service is not service:
+        _label_index = LabelIndex(service)
+    return _label_index
+
+def create_label(service, label_name, hidden=False):
+    """Creates a new label with the given name.
+
+    A hidden label is left out of the label list and message list in the
+    Gmail UI, but can still be searched for.
+    """
+    index = get_label_index(service)
     try:
-        label = {"name": label_name, "labelListVisibility": "labelShow", "messageListVisibility": "show"}
-        created_label = service.users().labels().create(userId="me", body=label).execute()
+        if hidden:
+            label = {"name": label_name, "labelListVisibility": "labelHide", "messageListVisibility": "hide"}
+        else:
+            label = {"name": label_name, "labelListVisibility": "labelShow", "messageListVisibility": "show"}
+        created_label = _execute(service.users().labels().create(userId="me", body=label))
         print(f"Created label: {label_name} (ID: {created_label['id']})")
+        index.add(label_name, created_label["id"])
         return created_label["id"]
     except Exception as e:
         if "Label name exists" in str(e):
-            return get_label_id(service, label_name)
+            # Created outside this session; our index (or its disk copy) is stale.
+            try:
+                index.refresh()
+            except Exception as refresh_error:
+                print(f"Error refreshing labels: {refresh_error}")
+                return None
+            return index.get(label_name)
         print(f"Error creating label {label_name}: {e}")
         return None
 
 def get_label_id(service, label_name):
     """Retrieves the ID of a label by its name."""
     try:
-        results = service.users().labels().list(userId="me").execute()
-        labels = results.get("labels", [])
-        for label in labels:
-            if label["name"].lower() == label_name.lower():
-                return label["id"]
-        return None
+        return get_label_index(service).get(label_name)
     except Exception as e:
         print(f"Error getting label ID for {label_name}: {e}")
         return None
 
+def get_processed_label_name():
+    """Returns the name of the processed-marker label, or None if it is turned off."""
+    return os.getenv("PROCESSED_LABEL", DEFAULT_PROCESSED_LABEL).strip() or None
+
+def label_search_name(label_name):
+    """Returns how a label is written in a Gmail search query.
+
+    E.g. "Organizer/Processed" is searched for as "label:organizer-processed".
+    Gmail search lowercases label names and writes spaces and the "/" of
+    nested labels as hyphens.
+    """
+    return re.sub(r"[\s/]+", "-", label_name.strip()).lower()
+
 def apply_label(service, message_id, label_id):
     """Applies a label to a message."""
     try:
         body = {"addLabelIds": [label_id]}
-        service.users().messages().modify(userId="me", id=message_id, body=body).execute()
+        _execute(service.users().messages().modify(userId="me", id=message_id, body=body))
         print(f"Applied label {label_id} to message {message_id}")
     except Exception as e:
         print(f"Error applying label to message {message_id}: {e}")
@@ -100,27 +236,245 @@ def get_body_from_payload(payload):
         
     return ""
 
-def fetch_emails(service, query="is:unread", max_results=10, exclude_ids=None):
-    """Fetches emails matching the query, excluding specified IDs."""
-    if exclude_ids is None:
-        exclude_ids = set()
-        
-    messages = []
+def parse_message(message_id, msg, with_body=True):
+    """Converts a raw Gmail message resource into our email dict.
+
+    With with_body=False the body is left empty and not decoded.
+    """
+    # Parse headers
+    headers = msg["payload"]["headers"]
+    subject = next((h["value"] for h in headers if h["name"] == "Subject"), "No Subject")
+    sender = next((h["value"] for h in headers if h["name"] == "From"), "Unknown Sender")
+    recipient = next((h["value"] for h in headers if h["name"] == "To"), "Unknown Recipient")
+
+    # Get snippet
+    snippet = msg.get("snippet", "")
+
+    # Get body using recursive helper
+    body = get_body_from_payload(msg["payload"]) if with_body else ""
+
+    return {
+        "id": message_id,
+        "subject": subject,
+        "sender": sender,
+        "recipient": recipient,
+        "snippet": snippet,
+        "body": body
+    }
+
+def _thread_http(service):
+    """Returns an authorized Http owned by the calling thread.
+
+    httplib2 connections are not thread-safe, so concurrent batches each need
+    their own. Returns None when the service has no credentials (e.g. fakes),
+    in which case the batch falls back to the service's own http.
+    """
+    credentials = getattr(getattr(service, "_http", None), "credentials", None)
+    if credentials is None:
+        return None
+    http = getattr(_thread_local, "http", None)
+    if http is None or http.credentials is not credentials:
+        # build_http() sets the same 60 s socket timeout build() uses
+        http = AuthorizedHttp(credentials, http=build_http())
+        _thread_local.http = http
+    return http
+
+def _is_retryable(error):
+    """Rate limits, server errors and transport failures are worth retrying."""
+    if isinstance(error, HttpError):
+        return error.resp.status in RETRYABLE_STATUSES
+    return True
+
+def _method_name(request):
+    """Returns a request's API method, e.g. "messages.get"."""
+    method = getattr(request, "methodId", None) or getattr(request, "method", "unknown")
+    return method.removeprefix("gmail.users.")
+
+def _execute(request, **kwargs):
+    """Executes one API request, recording its call count, latency and errors by method."""
+    method = _method_name(request)
+    metrics.count("gmail_calls", method=method)
+    try:
+        with metrics.timed("gmail_request_seconds", method=method):
+            return request.execute(**kwargs)
+    except Exception:
+        metrics.count("gmail_errors", method=method)
+        raise
+
+def _execute_batch(service, keys, make_request, http=None):
+    """Runs one batch of API calls and returns (results, errors) keyed by item.
+
+    The batch's round trip is timed as method "batch"; the calls in it are
+    counted under their own methods.
+    """
+    results = {}
+    errors = {}
+    methods = {}
+
+    def callback(request_id, response, exception):
+        if exception is not None:
+            errors[request_id] = exception
+            metrics.count("gmail_errors", method=methods[request_id])
+        else:
+            results[request_id] = response
+
+    batch = service.new_batch_http_request(callback=callback)
+    for key in keys:
+        request = make_request(key)
+        methods[key] = _method_name(request)
+        metrics.count("gmail_calls", method=methods[key])
+        batch.add(request, request_id=key)
+
+    try:
+        with metrics.timed("gmail_request_seconds", method="batch"):
+            batch.execute(http=http)
+    except Exception as e:
+        metrics.count("gmail_errors", method="batch")
+        # The whole batch failed in transport; every item is retryable.
+        for key in keys:
+            if key not in results:
+                errors[key] = e
+
+    return results, errors
+
+def _run_batched(service, keys, make_request, batch_size=BATCH_SIZE, max_in_flight=MAX_BATCHES_IN_FLIGHT):
+    """Runs make_request(key) for every key through Gmail's HTTP batch endpoint.
+
+    Splits keys into batches of batch_size and keeps at most max_in_flight
+    batches running at once. Items that fail with a retryable error are
+    retried with exponential backoff.
+
+    Returns (results, errors): dicts mapping each key to its response, or to
+    the exception it still failed with after retries.
+    """
+    results = {}
+    failed = {}
+    pending = list(dict.fromkeys(keys))
+    batch_size = max(1, min(batch_size, 100))
+    max_in_flight = max(1, max_in_flight)
+
+    for attempt in range(BATCH_MAX_RETRIES + 1):
+        if not pending:
+            break
+        if attempt > 0:
+            time.sleep(2 ** (attempt - 1))
+            print(f"Retrying {len(pending)} requests (attempt {attempt + 1})...")
+
+        chunks = [pending[i:i + batch_size] for i in range(0, len(pending), batch_size)]
+        errors = {}
+
+        if max_in_flight == 1 or len(chunks) == 1:
+            outcomes = (_execute_batch(service, chunk, make_request) for chunk in chunks)
+            for batch_results, batch_errors in outcomes:
+                results.update(batch_results)
+                errors.update(batch_errors)
+        else:
+            with ThreadPoolExecutor(max_workers=max_in_flight) as executor:
+                outcomes = executor.map(
+                    lambda chunk: _execute_batch(service, chunk, make_request, http=_thread_http(service)),
+                    chunks,
+                )
+                for batch_results, batch_errors in outcomes:
+                    results.update(batch_results)
+                    errors.update(batch_errors)
+
+        pending = []
+        for key, error in errors.items():
+            if _is_retryable(error) and attempt < BATCH_MAX_RETRIES:
+                pending.append(key)
+            else:
+                failed[key] = error
+
+    return results, failed
+
+def get_messages_batch(service, message_ids, batch_size=BATCH_SIZE, max_in_flight=MAX_BATCHES_IN_FLIGHT, **get_kwargs):
+    """Fetches many messages through Gmail's HTTP batch endpoint.
+
+    Messages that still fail after retries are reported and left out. Extra
+    keyword arguments are passed to messages.get.
+
+    Returns a dict mapping message ID to the raw message resource.
+    """
+    fetched, errors = _run_batched(
+        service,
+        message_ids,
+        lambda message_id: service.users().messages().get(userId="me", id=message_id, **get_kwargs),
+        batch_size=batch_size,
+        max_in_flight=max_in_flight,
+    )
+    for message_id, error in errors.items():
+        print(f"Error fetching message {message_id}: {error}")
+    return fetched
+
+def _batch_modify_chunk(service, message_ids, body):
+    """Sends one messages.batchModify call, retrying transient errors.
+
+    Returns None on success or the last exception on failure.
+    """
+    for attempt in range(BATCH_MAX_RETRIES + 1):
+        try:
+            _execute(service.users().messages().batchModify(
+                userId="me", body={"ids": message_ids, **body}
+            ))
+            return None
+        except Exception as e:
+            if not _is_retryable(e) or attempt == BATCH_MAX_RETRIES:
+                return e
+            time.sleep(2 ** attempt)
+
+def batch_modify_labels(service, message_ids, add_label_ids=None, remove_label_ids=None):
+    """Adds and/or removes labels on many messages at once.
+
+    Uses messages.batchModify with up to BATCH_MODIFY_MAX_IDS messages per
+    call. batchModify is all-or-nothing, so when a chunk keeps failing its
+    messages are retried individually (through the batch endpoint) to find
+    out which ones are actually bad.
+
+    Returns a dict mapping message ID to the error for every message that
+    could not be modified.
+    """
+    body = {}
+    if add_label_ids:
+        body["addLabelIds"] = list(add_label_ids)
+    if remove_label_ids:
+        body["removeLabelIds"] = list(remove_label_ids)
+
+    message_ids = list(dict.fromkeys(message_ids))
+    failed = {}
+    for start in range(0, len(message_ids), BATCH_MODIFY_MAX_IDS):
+        chunk = message_ids[start:start + BATCH_MODIFY_MAX_IDS]
+        error = _batch_modify_chunk(service, chunk, body)
+        if error is None:
+            continue
+
+        print(f"batchModify failed for {len(chunk)} messages ({error}); retrying them one by one...")
+        _, errors = _run_batched(
+            service,
+            chunk,
+            lambda message_id: service.users().messages().modify(userId="me", id=message_id, body=body),
+        )
+        for message_id, item_error in errors.items():
+            print(f"Error modifying labels on message {message_id}: {item_error}")
+        failed.update(errors)
+
+    return failed
+
+def list_message_ids(service, query, max_results, exclude_ids):
+    """Pages through messages.list until max_results non-excluded IDs are found."""
+    message_ids = []
     page_token = None
     
-    print(f"Searching for {max_results} new emails (skipping {len(exclude_ids)} verified)...")
-    
     # Fetch until we have enough non-excluded messages or run out
-    while len(messages) < max_results:
+    while len(message_ids) < max_results:
         # Fetch a batch of IDs (lightweight)
         # Request more than needed to account for exclusions
-        batch_size = max(50, max_results * 2)
-        results = service.users().messages().list(
+        page_size = max(50, max_results * 2)
+        results = _execute(service.users().messages().list(
             userId="me", 
             q=query, 
-            maxResults=batch_size,
+            maxResults=page_size,
             pageToken=page_token
-        ).execute()
+        ))
         
         batch = results.get("messages", [])
         if not batch:
@@ -128,46 +482,201 @@ def fetch_emails(service, query="is:unread", max_results=10, exclude_ids=None):
             
         for msg in batch:
             if msg["id"] not in exclude_ids:
-                messages.append(msg)
-                if len(messages) >= max_results:
+                message_ids.append(msg["id"])
+                if len(message_ids) >= max_results:
                     break
         
         page_token = results.get("nextPageToken")
         if not page_token:
             break
-            
-    email_data = []
+
+    return message_ids
+
+def _load_sync_state(state_file):
+    if not os.path.exists(state_file):
+        return None
+    try:
+        with open(state_file, "r") as f:
+            return json.load(f)
+    except Exception as e:
+        print(f"Warning: Could not read sync state {state_file}: {e}")
+        return None
+
+def _save_sync_state(state_file, state):
+    os.makedirs(os.path.dirname(state_file) or ".", exist_ok=True)
+    tmp_file = state_file + ".tmp"
+    with open(tmp_file, "w") as f:
+        json.dump(state, f)
+    os.replace(tmp_file, state_file)
+
+def _list_history(service, start_history_id, label_id):
+    """Pages through users.history.list and returns (records, latest_history_id)."""
+    records = []
+    page_token = None
+    latest_history_id = start_history_id
+    while True:
+        results = _execute(service.users().history().list(
+            userId="me",
+            startHistoryId=start_history_id,
+            labelId=label_id,
+            historyTypes=["messageAdded", "messageDeleted", "labelAdded", "labelRemoved"],
+            maxResults=500,
+            pageToken=page_token
+        ))
+        records.extend(results.get("history", []))
+        latest_history_id = results.get("historyId", latest_history_id)
+        page_token = results.get("nextPageToken")
+        if not page_token:
+            return records, latest_history_id
+
+def start_inbox_sync(service, state_file=SYNC_STATE_FILE):
+    """Records the mailbox's current historyId as the starting point for sync_inbox.
+
+    Call this before a full listing so mail arriving during the run is not missed.
+    """
+    profile = _execute(service.users().getProfile(userId="me"))
+    _save_sync_state(state_file, {"history_id": profile["historyId"], "message_ids": []})
+
+def sync_inbox(service, exclude_ids, state_file=SYNC_STATE_FILE):
+    """Returns IDs of inbox messages added since the last sync, newest first.
+
+    Reads the last seen historyId from state_file and asks users.history.list
+    only for what changed since then, so the cost follows the amount of new
+    mail rather than the size of the inbox. IDs that have not been excluded
+    yet (e.g. not verified) are carried over to the next sync.
+
+    Returns None when there is no usable state: on the first run, or when
+    Gmail no longer has history that old. Callers should then fall back to
+    a full listing after calling start_inbox_sync.
+    """
+    state = _load_sync_state(state_file)
+    if not state:
+        return None
+
+    try:
+        records, latest_history_id = _list_history(service, state["history_id"], "INBOX")
+    except HttpError as e:
+        if e.resp.status == 404:
+            print("Sync history has expired, falling back to a full listing.")
+            return None
+        raise
+
+    # Oldest first, so later history records win
+    message_ids = dict.fromkeys(state["message_ids"])
+    deleted_ids = []
+    for record in records:
+        for change in record.get("messagesAdded", []):
+            if "INBOX" in change["message"].get("labelIds", []):
+                message_ids[change["message"]["id"]] = None
+        for change in record.get("labelsAdded", []):
+            if "INBOX" in change.get("labelIds", []):
+                message_ids[change["message"]["id"]] = None
+        for change in record.get("labelsRemoved", []):
+            if "INBOX" in change.get("labelIds", []):
+                message_ids.pop(change["message"]["id"], None)
+        for change in record.get("messagesDeleted", []):
+            message_ids.pop(change["message"]["id"], None)
+            deleted_ids.append(change["message"]["id"])
+
+    if deleted_ids:
+        get_message_store().delete_many(deleted_ids)
+
+    pending_ids = [message_id for message_id in message_ids if message_id not in exclude_ids]
+    _save_sync_state(state_file, {"history_id": latest_history_id, "message_ids": pending_ids})
+
+    print(f"Synced {len(records)} history records since last run.")
+    return pending_ids[::-1]
+
+def find_message_ids(service, query="is:unread", max_results=10, exclude_ids=None, incremental=False):
+    """Lists up to max_results IDs of messages matching the query, minus exclude_ids.
+
+    With incremental=True only inbox messages added since the previous
+    incremental run are considered (see sync_inbox); query is then only used
+    for the full listing on the first run or after the history expires.
+    """
+    if exclude_ids is None:
+        exclude_ids = set()
+
+    print(f"Searching for {max_results} new emails (skipping {len(exclude_ids)} verified)...")
+
+    message_ids = None
+    if incremental:
+        message_ids = sync_inbox(service, exclude_ids)
+        if message_ids is None:
+            start_inbox_sync(service)
+        else:
+            message_ids = message_ids[:max_results]
+    if message_ids is None:
+        message_ids = list_message_ids(service, query, max_results, exclude_ids)
     
-    if not messages:
+    if not message_ids:
         print("No new messages found.")
         return []
 
-    print(f"Found {len(messages)} new messages to process.")
-    for message in messages:
-        msg = service.users().messages().get(userId="me", id=message["id"]).execute()
-        
-        # Parse headers
-        headers = msg["payload"]["headers"]
-        subject = next((h["value"] for h in headers if h["name"] == "Subject"), "No Subject")
-        sender = next((h["value"] for h in headers if h["name"] == "From"), "Unknown Sender")
-        recipient = next((h["value"] for h in headers if h["name"] == "To"), "Unknown Recipient")
-        
-        # Get snippet
-        snippet = msg.get("snippet", "")
-
-        # Get body using recursive helper
-        body = get_body_from_payload(msg["payload"])
-
-        email_data.append({
-            "id": message["id"],
-            "subject": subject,
-            "sender": sender,
-            "recipient": recipient,
-            "snippet": snippet,
-            "body": body
-        })
-        
-    return email_data
+    print(f"Found {len(message_ids)} new messages to process.")
+    return message_ids
+
+def iter_emails(service, message_ids, chunk_size=BATCH_SIZE * MAX_BATCHES_IN_FLIGHT,
+                batch_size=BATCH_SIZE, max_in_flight=MAX_BATCHES_IN_FLIGHT, use_cache=None, projection="full"):
+    """Yields the parsed emails for message_ids, chunk_size at a time, in order.
+
+    Each chunk is downloaded only when the previous one has been consumed,
+    so a caller that processes chunks as they come holds one chunk in memory
+    rather than every email. Messages already in the local message store
+    are served from disk; only the misses are downloaded, through the batch
+    endpoint, batch_size messages per HTTP request with up to max_in_flight
+    requests in parallel. Set use_cache=False (or USE_MESSAGE_CACHE=false in
+    .env) to bypass the store.
+
+    projection="metadata" fetches only the Subject/From/To headers and the
+    snippet, returning an empty body; use it when bodies are not needed.
+    """
+    if use_cache is None:
+        use_cache = os.getenv("USE_MESSAGE_CACHE", "true").lower() == "true"
+
+    with_body = projection == "full"
+    store = get_message_store() if use_cache else None
+    for start in range(0, len(message_ids), chunk_size):
+        chunk = message_ids[start:start + chunk_size]
+        emails_by_id = store.get_many(chunk, need_body=with_body) if store else {}
+        misses = [message_id for message_id in chunk if message_id not in emails_by_id]
+
+        fetched = get_messages_batch(
+            service,
+            misses,
+            batch_size=batch_size,
+            max_in_flight=max_in_flight,
+            **PROJECTIONS[projection]
+        )
+
+        new_entries = []
+        for message_id, msg in fetched.items():
+            email = parse_message(message_id, msg, with_body=with_body)
+            emails_by_id[message_id] = email
+            new_entries.append((email, msg.get("historyId"), len(json.dumps(msg))))
+
+        if store:
+            store.put_many(new_entries, has_body=with_body)
+
+        yield [emails_by_id[message_id] for message_id in chunk if message_id in emails_by_id]
+
+    if store:
+        store.report()
+
+def fetch_emails(service, query="is:unread", max_results=10, exclude_ids=None,
+                 batch_size=BATCH_SIZE, max_in_flight=MAX_BATCHES_IN_FLIGHT, incremental=False,
+                 use_cache=None, projection="full"):
+    """Fetches emails matching the query, excluding specified IDs.
+
+    Lists the IDs with find_message_ids, then downloads them with
+    iter_emails (see both for the options) and returns them all as a list.
+    """
+    message_ids = find_message_ids(service, query, max_results, exclude_ids, incremental)
+    emails = []
+    for chunk in iter_emails(service, message_ids, batch_size=batch_size, max_in_flight=max_in_flight,
+                             use_cache=use_cache, projection=projection):
+        emails.extend(chunk)
+    return emails
 
 if __name__ == "__main__":
     service = authenticate()
@@ -1,5 +1,12 @@
+import json
 import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from dotenv import load_dotenv
+from src import metrics
+from src.prediction_cache import get_prediction_cache, prediction_key
 
 load_dotenv()
 
@@ -7,15 +14,216 @@ load_dotenv()
 _client = None
 _llm_type = None
 _model_context_length = None
+_model_name = None
+_rate_limiter = None
+_prompt_cache = None
+_gemini_prefix_cache = None
+_gemini_prefix_lock = threading.Lock()
+_latencies = []
+_latencies_lock = threading.Lock()
+
+PROMPT_PATH = os.path.join("prompts", "categorize_email_prompt.md")
+DEFAULT_SYSTEM_PROMPT = "You are an email categorization assistant."
+# Token budget for the email body. The body gets whatever the context has left
+# after the prompt and RESPONSE_TOKEN_RESERVE, capped by LLM_BODY_TOKEN_BUDGET.
+RESPONSE_TOKEN_RESERVE = 64
+# Without a real tokenizer the body only gets this share of what the
+# approximation says is left, as a margin for text it undercounts
+APPROX_BUDGET_FACTOR = 0.85
+TRUNCATION_MARKER = "\n[... truncated for length ...]"
+# One match per approximate token, with any leading whitespace: a non-ASCII
+# letter (CJK and the like are at least a token each), up to four ASCII
+# letters, up to three digits (so hex and base64 IDs split like they do in
+# BPE vocabularies), or a single symbol
+_APPROX_TOKEN_RE = re.compile(r"\s*(?:[^\W\x00-\x7f]|[A-Za-z_]{1,4}|[0-9]{1,3}|[^\w\s])")
+_static_token_counts = {}
+_static_token_counts_lock = threading.Lock()
+
+# Gemini only caches prefixes of at least this many tokens explicitly
+GEMINI_MIN_CACHE_TOKENS = 1024
+GEMINI_CACHE_TTL_SECONDS = 3600
+# Cached content is recreated this long before it would expire
+GEMINI_CACHE_REFRESH_SECONDS = 300
+
+GEMINI_MODEL = "gemini-2.5-flash"
+
+# Default (requests/min, tokens/min) per backend; None means unlimited.
+# Override with LLM_RPM / LLM_TPM in .env.
+DEFAULT_RATE_LIMITS = {
+    "gemini": (60, 1_000_000),
+    "local": (None, None),
+    "local_openai": (None, None),
+}
+DEFAULT_CONCURRENCY = 4
+
+# Batched classification packs many emails into one request, each body cut
+# to BATCH_BODY_TOKENS, and asks for a JSON object of email number -> category.
+BATCH_BODY_TOKENS = 400
+BATCH_MAX_EMAILS = 25
+BATCH_OUTPUT_TOKENS_PER_EMAIL = 16
+BATCH_INSTRUCTIONS = """Categorize each of the {count} emails below.
+Respond with ONLY a JSON object that maps each email's number to its category name, for example {{"1": "Category A", "2": "Category B"}}. Include every number from 1 to {count}."""
+
+class TokenBucket:
+    """Thread-safe token bucket refilled continuously at rate_per_minute."""
+
+    def __init__(self, rate_per_minute):
+        self.capacity = rate_per_minute
+        self.tokens = rate_per_minute
+        self.rate = rate_per_minute / 60.0
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, amount=1):
+        """Blocks until amount tokens are available, then takes them."""
+        # A single request larger than the bucket would otherwise wait forever
+        amount = min(amount, self.capacity)
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                wait = (amount - self.tokens) / self.rate
+            time.sleep(wait)
+
+class RateLimiter:
+    """Enforces requests-per-minute and tokens-per-minute limits for one backend."""
+
+    def __init__(self, requests_per_minute=None, tokens_per_minute=None):
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+
+    def acquire(self, tokens):
+        if self.requests:
+            self.requests.acquire(1)
+        if self.tokens:
+            self.tokens.acquire(tokens)
+
+def _get_rate_limiter():
+    """Returns the rate limiter for the configured backend."""
+    global _rate_limiter
+    if _rate_limiter is None:
+        rpm, tpm = DEFAULT_RATE_LIMITS.get(_llm_type, (None, None))
+        rpm = int(os.getenv("LLM_RPM", rpm or 0)) or None
+        tpm = int(os.getenv("LLM_TPM", tpm or 0)) or None
+        _rate_limiter = RateLimiter(rpm, tpm)
+    return _rate_limiter
+
+def estimate_tokens(text):
+    """Rough token count (about 4 characters per token)."""
+    return len(text) // 4 + 1
+
+def _approx_token_ends(text, limit):
+    """Yields the end offset of each approximate token in text, at most limit of them."""
+    for count, match in enumerate(_APPROX_TOKEN_RE.finditer(text)):
+        if count >= limit:
+            return
+        yield match.end()
+
+def count_tokens(text):
+    """Counts tokens with the backend's tokenizer, or the local approximation."""
+    if _llm_type == "local":
+        return len(_client.tokenize(text))
+    return sum(1 for _ in _approx_token_ends(text, len(text) + 1))
+
+def truncate_to_tokens(text, max_tokens):
+    """Cuts text at a token boundary so it holds at most max_tokens tokens.
+
+    Walks the text once with the approximate tokenizer and stops as soon as
+    the budget is reached. When the backend has a real tokenizer, the
+    approximate budget is scaled by how the two counts compare on the text
+    that could fit. Returns (text, was_truncated).
+    """
+    max_tokens = max(0, max_tokens)
+    # No token is longer than this on average, so the rest can never fit
+    window = text[:max_tokens * 8 + 8]
+    budget = max_tokens
+    if _llm_type == "local" and window:
+        real = count_tokens(window)
+        if real <= max_tokens and len(window) == len(text):
+            return text, False
+        approx = sum(1 for _ in _approx_token_ends(window, len(window) + 1))
+        budget = int(max_tokens * approx / max(real, 1))
+
+    last_end = 0
+    for count, end in enumerate(_approx_token_ends(window, budget + 1), 1):
+        if count > budget:
+            return text[:last_end], True
+        last_end = end
+    if len(window) == len(text):
+        return text, False
+    return text[:last_end], True
+
+def _static_token_count(system_prompt, user_template):
+    """Tokens used by everything except the email fields, cached per prompt and backend."""
+    key = (_llm_type, _model_name, system_prompt, user_template)
+    with _static_token_counts_lock:
+        if key in _static_token_counts:
+            return _static_token_counts[key]
+
+    empty_user = user_template.format(subject="", snippet="", body="")
+    if _llm_type == "local":
+        import lmstudio as lms
+
+        # Includes the chat template's own tokens (role markers etc.)
+        chat = lms.Chat.from_history({
+            "messages": [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": empty_user}
+            ]
+        })
+        count = len(_client.tokenize(_client.apply_prompt_template(chat)))
+    else:
+        count = count_tokens(system_prompt) + count_tokens(empty_user)
+
+    with _static_token_counts_lock:
+        _static_token_counts[key] = count
+    return count
+
+def fit_body(system_prompt, user_template, subject, snippet, body):
+    """Truncates body so the whole request fits the model's context.
+
+    The body's budget is the context length minus the (cached) static
+    prompt tokens, the subject and snippet, and RESPONSE_TOKEN_RESERVE,
+    scaled by APPROX_BUDGET_FACTOR unless the backend has a real tokenizer,
+    and further capped by LLM_BODY_TOKEN_BUDGET when set. Returns the body,
+    with a truncation marker appended when it was cut.
+    """
+    budget = os.getenv("LLM_BODY_TOKEN_BUDGET")
+    budget = int(budget) if budget else None
+    if _model_context_length:
+        available = (_model_context_length - RESPONSE_TOKEN_RESERVE
+                     - _static_token_count(system_prompt, user_template)
+                     - count_tokens(subject) - count_tokens(snippet)
+                     - count_tokens(TRUNCATION_MARKER))
+        if _llm_type != "local":
+            available = int(available * APPROX_BUDGET_FACTOR)
+        budget = available if budget is None else min(budget, available)
+    if budget is None:
+        return body
+
+    truncated, was_truncated = truncate_to_tokens(body, budget)
+    if not was_truncated:
+        return body
+    metrics.count("llm_truncations", kind="body")
+    print(f"Truncated email body from {len(body)} to {len(truncated)} chars to fit a {budget}-token budget")
+    return truncated + TRUNCATION_MARKER
 
 def configure_llm():
     """Configures the LLM client based on environment variables."""
-    global _client, _llm_type, _model_context_length
+    global _client, _llm_type, _model_context_length, _model_name, _rate_limiter
     
     # Check which LLM to use
     use_local = os.getenv("USE_LOCAL_LLM", "false").lower() == "true"
     
-    if use_local:
+    # LOCAL_LLM_API=openai talks to any OpenAI-compatible server (LM Studio,
+    # llama.cpp, vLLM...) even when the lmstudio SDK is installed
+    use_openai_api = os.getenv("LOCAL_LLM_API", "lmstudio").lower() == "openai"
+    
+    if use_local and not use_openai_api:
         # Local LLM via LM Studio native SDK
         try:
             import lmstudio as lms
@@ -25,59 +233,64 @@ def configure_llm():
             
             # Get context length from the loaded model
             _model_context_length = _client.get_context_length()
-            model_name = "LM Studio Model"  # LM Studio SDK doesn't expose model name easily
+            model_name = getattr(_client, "identifier", "LM Studio Model")
+            _model_name = model_name
             
             print(f"Using LM Studio with context length: {_model_context_length} tokens")
             
         except ImportError:
             # Fallback to OpenAI-compatible API if lmstudio package not installed
             print("LM Studio SDK not found, using OpenAI-compatible API...")
-            from openai import OpenAI
-            
-            base_url = os.getenv("LOCAL_LLM_BASE_URL", "http://localhost:1234/v1")
-            api_key = os.getenv("LOCAL_LLM_API_KEY", "lm-studio")
-            
-            _client = OpenAI(base_url=base_url, api_key=api_key)
-            _llm_type = "local_openai"
-            
-            # Auto-detect model if not specified
-            model_name = os.getenv("LOCAL_LLM_MODEL")
-            if not model_name:
-                try:
-                    models = _client.models.list()
-                    if models.data:
-                        model_name = models.data[0].id
-                        print(f"Auto-detected model: {model_name}")
-                    else:
-                        raise ValueError("No models found in LM Studio. Please load a model first.")
-                except Exception as e:
-                    raise ValueError(f"Failed to detect model from LM Studio: {e}")
-            
-            # Try to get context length from model info
-            # First check if manually configured
-            manual_context = os.getenv("LOCAL_LLM_CONTEXT_LENGTH")
-            if manual_context:
-                _model_context_length = int(manual_context)
-                print(f"Using configured context length: {_model_context_length} tokens")
-            else:
-                try:
-                    model_info = _client.models.retrieve(model_name)
-                    if hasattr(model_info, 'context_length'):
-                        _model_context_length = model_info.context_length
-                        print(f"Model context length: {_model_context_length} tokens")
-                    else:
-                        _model_context_length = 4096
-                        print(f"Could not retrieve context length, using default: {_model_context_length}")
-                        print("Tip: Set LOCAL_LLM_CONTEXT_LENGTH in .env to match your model's context")
-                except Exception as e:
+            use_openai_api = True
+    
+    if use_local and use_openai_api:
+        from openai import OpenAI
+        
+        base_url = os.getenv("LOCAL_LLM_BASE_URL", "http://localhost:1234/v1")
+        api_key = os.getenv("LOCAL_LLM_API_KEY", "lm-studio")
+        
+        _client = OpenAI(base_url=base_url, api_key=api_key)
+        _llm_type = "local_openai"
+        
+        # Auto-detect model if not specified
+        model_name = os.getenv("LOCAL_LLM_MODEL")
+        if not model_name:
+            try:
+                models = _client.models.list()
+                if models.data:
+                    model_name = models.data[0].id
+                    print(f"Auto-detected model: {model_name}")
+                else:
+                    raise ValueError("No models found in LM Studio. Please load a model first.")
+            except Exception as e:
+                raise ValueError(f"Failed to detect model from LM Studio: {e}")
+        
+        # Try to get context length from model info
+        # First check if manually configured
+        manual_context = os.getenv("LOCAL_LLM_CONTEXT_LENGTH")
+        if manual_context:
+            _model_context_length = int(manual_context)
+            print(f"Using configured context length: {_model_context_length} tokens")
+        else:
+            try:
+                model_info = _client.models.retrieve(model_name)
+                if hasattr(model_info, 'context_length'):
+                    _model_context_length = model_info.context_length
+                    print(f"Model context length: {_model_context_length} tokens")
+                else:
                     _model_context_length = 4096
                     print(f"Could not retrieve context length, using default: {_model_context_length}")
                     print("Tip: Set LOCAL_LLM_CONTEXT_LENGTH in .env to match your model's context")
-            
-            # Store model name for later use
-            os.environ["LOCAL_LLM_MODEL"] = model_name
-            print(f"Using local LLM at {base_url} with model: {model_name}")
-    else:
+            except Exception as e:
+                _model_context_length = 4096
+                print(f"Could not retrieve context length, using default: {_model_context_length}")
+                print("Tip: Set LOCAL_LLM_CONTEXT_LENGTH in .env to match your model's context")
+        
+        # Store model name for later use
+        os.environ["LOCAL_LLM_MODEL"] = model_name
+        _model_name = model_name
+        print(f"Using local LLM at {base_url} with model: {model_name}")
+    if not use_local:
         # Google Gemini
         from google import genai
         
@@ -87,109 +300,451 @@ def configure_llm():
         
         _client = genai.Client(api_key=api_key)
         _llm_type = "gemini"
+        _model_name = GEMINI_MODEL
         print("Using Google Gemini")
 
-def categorize_email(subject, snippet, body):
-    """Categorizes an email using the configured LLM."""
+    # Limits depend on the backend that was just chosen
+    _rate_limiter = None
+
+def _prediction_cache_enabled():
+    return os.getenv("USE_PREDICTION_CACHE", "true").lower() == "true"
+
+def load_prompt_template():
+    """Returns the categorization prompt template, re-reading it only when the file changes."""
+    return _load_prompt()[0]
+
+def _load_prompt():
+    """Returns (template, system_prompt, user_template), cached by the file's mtime."""
+    global _prompt_cache
+    prompt_path = os.path.join(os.getcwd(), PROMPT_PATH)
+    mtime = os.stat(prompt_path).st_mtime_ns
+    cached = _prompt_cache
+    if cached is None or cached[0] != prompt_path or cached[1] != mtime:
+        with open(prompt_path, "r") as f:
+            template = f.read()
+        instructions, email_part = split_prompt_template(template)
+        if email_part:
+            # The instructions were written to go through str.format; undo its escaping
+            system_prompt = instructions.replace("{{", "{").replace("}}", "}")
+            user_template = email_part
+        else:
+            system_prompt = DEFAULT_SYSTEM_PROMPT
+            user_template = template
+        cached = (prompt_path, mtime, template, system_prompt, user_template)
+        _prompt_cache = cached
+    return cached[2:]
+
+def get_prompt_parts():
+    """Returns (system_prompt, user_template) for categorize_email.
+
+    The static instructions and category list go into the system prompt,
+    which is identical for every email, so local servers can reuse its KV
+    cache and Gemini can serve it from cached content. Only the per-email
+    fields are sent as the user message. Set LLM_SPLIT_PROMPT=false to send
+    the whole template as the user message instead.
+    """
+    template, system_prompt, user_template = _load_prompt()
+    if os.getenv("LLM_SPLIT_PROMPT", "true").lower() != "true":
+        return DEFAULT_SYSTEM_PROMPT, template
+    return system_prompt, user_template
+
+def _gemini_prefix_config(system_prompt):
+    """Returns the generate_content config that supplies system_prompt to Gemini.
+
+    Long prefixes are stored once as cached content; shorter ones (below
+    Gemini's caching minimum) are sent as a system instruction, which
+    Gemini can still match with its implicit prefix cache. Cached content
+    lives for GEMINI_CACHE_TTL_SECONDS, so it is recreated shortly before
+    it expires (and creation is retried as often after a failure).
+    """
+    global _gemini_prefix_cache
+    if estimate_tokens(system_prompt) < GEMINI_MIN_CACHE_TOKENS:
+        return {"system_instruction": system_prompt}
+
+    with _gemini_prefix_lock:
+        cached = _gemini_prefix_cache
+        if cached is None or cached[0] != system_prompt or time.monotonic() >= cached[2]:
+            refresh_at = time.monotonic() + GEMINI_CACHE_TTL_SECONDS - GEMINI_CACHE_REFRESH_SECONDS
+            try:
+                content = _client.caches.create(
+                    model=GEMINI_MODEL,
+                    config={"system_instruction": system_prompt, "ttl": f"{GEMINI_CACHE_TTL_SECONDS}s"},
+                )
+                cached = (system_prompt, content.name, refresh_at)
+            except Exception as e:
+                print(f"Could not create Gemini cached content, sending the prompt inline: {e}")
+                cached = (system_prompt, None, refresh_at)
+            _gemini_prefix_cache = cached
+    if cached[1] is None:
+        return {"system_instruction": system_prompt}
+    return {"cached_content": cached[1]}
+
+def _forget_gemini_prefix(name):
+    """Drops the cached content called name, so the next request recreates it."""
+    global _gemini_prefix_cache
+    with _gemini_prefix_lock:
+        if _gemini_prefix_cache is not None and _gemini_prefix_cache[1] == name:
+            _gemini_prefix_cache = None
+
+def report_llm_latency():
+    """Prints request count and latency percentiles for LLM calls made so far."""
+    with _latencies_lock:
+        latencies = sorted(_latencies)
+    if not latencies:
+        return
+    pick = lambda q: latencies[min(len(latencies) - 1, int(q * len(latencies)))]
+    print(f"LLM requests: {len(latencies)}, latency avg {sum(latencies) / len(latencies) * 1000:.0f} ms, "
+          f"p50 {pick(0.5) * 1000:.0f} ms, p95 {pick(0.95) * 1000:.0f} ms")
+
+def report_llm_stats():
+    """Prints the prediction cache hit rate (when enabled) and LLM latency so far."""
+    if _prediction_cache_enabled():
+        get_prediction_cache().report()
+    report_llm_latency()
+
+def categorize_email(subject, snippet, body, use_cache=None):
+    """Categorizes an email using the configured LLM.
+
+    Identical emails categorized before with the same prompt template,
+    backend and model are answered from the prediction cache without an
+    LLM call. Pass use_cache=False (or set USE_PREDICTION_CACHE=false in
+    .env) to always ask the model.
+    """
     if _client is None:
         configure_llm()
-    
+    if use_cache is None:
+        use_cache = _prediction_cache_enabled()
+    if not use_cache:
+        return _categorize_email(subject, snippet, body)
+
     try:
-        prompt_path = os.path.join(os.getcwd(), "prompts", "categorize_email_prompt.md")
-        with open(prompt_path, "r") as f:
-            prompt_template = f.read()
+        prompt_template = load_prompt_template()
+    except OSError as e:
+        print(f"Error reading prompt template: {e}")
+        metrics.count("llm_uncategorized_fallbacks", reason="prompt")
+        return "Uncategorized"
+
+    cache = get_prediction_cache()
+    key = prediction_key(subject, snippet, body, prompt_template, _llm_type, _model_name)
+    category = cache.get(key)
+    if category is None:
+        category = _categorize_email(subject, snippet, body)
+        # "Uncategorized" is also what errors return, so it's not worth keeping
+        if category != "Uncategorized":
+            cache.put(key, category)
+    else:
+        metrics.count("llm_cache_hits")
+    return category
+
+def _categorize_email(subject, snippet, body):
+    """Asks the configured LLM to categorize one email."""
+    try:
+        system_prompt, user_template = get_prompt_parts()
+
+        # Cut the body at a token boundary so the request fits the context
+        body = fit_body(system_prompt, user_template, subject, snippet, body)
+        user_prompt = user_template.format(subject=subject, snippet=snippet, body=body)
+
+        # Wait for our share of the backend's request and token budget
+        _get_rate_limiter().acquire(estimate_tokens(system_prompt) + estimate_tokens(user_prompt))
+
+        category = _complete(user_prompt, system_prompt=system_prompt).strip()
+            
+        # Clean up markdown formatting
+        category = category.strip("*").strip()
+            
+        return category
+            
+    except Exception as e:
+        error_msg = str(e)
         
-        # Format the full prompt first
-        full_prompt = prompt_template.format(subject=subject, snippet=snippet, body=body)
+        # Handle context length errors specifically
+        if "context length" in error_msg.lower() or "tokens" in error_msg.lower():
+            print(f"Warning: Email too long for model context. Subject: {subject[:50]}...")
+            print("Tip: Increase context length in LM Studio or use a model with larger context window")
+            metrics.count("llm_uncategorized_fallbacks", reason="context_length")
+            return "Uncategorized"
         
+        print(f"Error calling LLM: {e}")
+        metrics.count("llm_uncategorized_fallbacks", reason="error")
+        return "Uncategorized"
+
+
+def split_prompt_template(template):
+    """Splits the template into its static instructions and the per-email part.
+
+    The per-email part starts at the first line with a {subject}, {snippet}
+    or {body} placeholder.
+    """
+    lines = template.splitlines(keepends=True)
+    for i, line in enumerate(lines):
+        if any(f"{{{field}}}" in line for field in ("subject", "snippet", "body")):
+            return "".join(lines[:i]).rstrip(), "".join(lines[i:])
+    return template.rstrip(), ""
+
+def parse_categories(template):
+    """Extracts category names from the "- Category: description" lines of the template."""
+    categories = []
+    for line in template.splitlines():
+        if line.strip().startswith("- "):
+            cat = line.strip()[2:].split(":")[0].strip()
+            categories.append(cat.strip("*").strip())
+    return categories
+
+def _complete(prompt, system_prompt=DEFAULT_SYSTEM_PROMPT, json_output=False):
+    """Sends one request to the configured backend and returns the reply text.
+
+    The system prompt is kept as a separate, stable prefix so backends can
+    reuse their prompt cache across requests.
+    """
+    start = time.perf_counter()
+    try:
         if _llm_type == "local":
-            # LM Studio native SDK - use proper tokenization
             import lmstudio as lms
-            
-            # Create a chat object
+
             chat = lms.Chat.from_history({
                 "messages": [
-                    {"role": "system", "content": "You are an email categorization assistant."},
-                    {"role": "user", "content": full_prompt}
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": prompt}
                 ]
             })
-            
-            # Check if it fits in context
-            formatted = _client.apply_prompt_template(chat)
-            token_count = len(_client.tokenize(formatted))
-            context_length = _client.get_context_length()
-            
-            # If too long, truncate the body and retry
-            if token_count >= context_length:
-                # Calculate how much to truncate
-                chars_per_token = len(body) / max(token_count - 500, 1)  # Rough estimate
-                max_body_chars = int((context_length - 500) * chars_per_token * 0.4)  # Use 50% for body
-                
-                truncated_body = body[:max_body_chars] + "\n[... truncated for length ...]"
-                full_prompt = prompt_template.format(subject=subject, snippet=snippet, body=truncated_body)
-                
-                chat = lms.Chat.from_history({
-                    "messages": [
-                        {"role": "system", "content": "You are an email categorization assistant."},
-                        {"role": "user", "content": full_prompt}
-                    ]
-                })
-                
-                print(f"Truncated email body from {len(body)} to {max_body_chars} chars to fit context")
-            
-            # Generate response
             response = _client.respond(chat, config={"temperature": 0.3})
-            category = response.content.strip()
-            return category
-            
+            reply = response.content
+            stats = getattr(response, "stats", None)
+            usage = (getattr(stats, "prompt_tokens_count", None), getattr(stats, "predicted_tokens_count", None))
         elif _llm_type == "local_openai":
-            # OpenAI-compatible API fallback
-            # Truncate body based on estimated context
-            max_tokens_for_body = int(_model_context_length * 0.5)
-            max_body_length = max_tokens_for_body * 4  # Rough estimate: 1 token ≈ 4 chars
-            
-            truncated_body = body[:max_body_length]
-            if len(body) > max_body_length:
-                truncated_body += "\n[... truncated for length ...]"
-            
-            prompt = prompt_template.format(subject=subject, snippet=snippet, body=truncated_body)
-            model_name = os.getenv("LOCAL_LLM_MODEL")
-            
             response = _client.chat.completions.create(
-                model=model_name,
+                model=os.getenv("LOCAL_LLM_MODEL"),
                 messages=[
-                    {"role": "system", "content": "You are an email categorization assistant."},
+                    {"role": "system", "content": system_prompt},
                     {"role": "user", "content": prompt}
                 ],
                 temperature=0.3,
             )
-            category = response.choices[0].message.content.strip()
-            
-            # Clean up markdown formatting
-            category = category.strip("*").strip()
-            
-            return category
+            reply = response.choices[0].message.content
+            usage = (getattr(response.usage, "prompt_tokens", None), getattr(response.usage, "completion_tokens", None))
         else:
-            # Gemini API call
-            response = _client.models.generate_content(
-                model="gemini-2.5-flash",
-                contents=prompt
-            )
-            category = response.text.strip()
-            
-            # Clean up markdown formatting
-            category = category.strip("*").strip()
-            
-            return category
-            
-    except Exception as e:
-        error_msg = str(e)
-        
-        # Handle context length errors specifically
-        if "context length" in error_msg.lower() or "tokens" in error_msg.lower():
-            print(f"Warning: Email too long for model context. Subject: {subject[:50]}...")
-            print("Tip: Increase context length in LM Studio or use a model with larger context window")
-            return "Uncategorized"
-        
-        print(f"Error calling LLM: {e}")
-        return "Uncategorized"
+            config = _gemini_prefix_config(system_prompt)
+            if json_output:
+                config["response_mime_type"] = "application/json"
+            try:
+                response = _client.models.generate_content(model=GEMINI_MODEL, contents=prompt, config=config)
+            except Exception as e:
+                if "cached_content" not in config or "cachedcontent" not in str(e).lower():
+                    raise
+                # The cached content expired or was deleted early: send the
+                # prompt inline this time and recreate it for the next request
+                _forget_gemini_prefix(config.pop("cached_content"))
+                config["system_instruction"] = system_prompt
+                response = _client.models.generate_content(model=GEMINI_MODEL, contents=prompt, config=config)
+            reply = response.text
+            usage_metadata = getattr(response, "usage_metadata", None)
+            usage = (getattr(usage_metadata, "prompt_token_count", None),
+                     getattr(usage_metadata, "candidates_token_count", None))
+    except Exception:
+        metrics.count("llm_errors", backend=_llm_type)
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        metrics.observe("llm_request_seconds", elapsed, backend=_llm_type)
+        with _latencies_lock:
+            _latencies.append(elapsed)
+
+    # Servers that don't report usage get the same estimate the budgets use
+    prompt_tokens, completion_tokens = usage
+    if prompt_tokens is None:
+        prompt_tokens = estimate_tokens(system_prompt) + estimate_tokens(prompt)
+    if completion_tokens is None:
+        completion_tokens = estimate_tokens(reply or "")
+    metrics.count("llm_prompt_tokens", prompt_tokens, backend=_llm_type)
+    metrics.count("llm_completion_tokens", completion_tokens, backend=_llm_type)
+    return reply
+
+def _batch_body(email):
+    """The email's body cut to its share of a batch prompt; done once per email."""
+    body, was_truncated = truncate_to_tokens(email["body"] or "", BATCH_BODY_TOKENS)
+    if was_truncated:
+        metrics.count("llm_truncations", kind="batch_body")
+        body += TRUNCATION_MARKER
+    return body
+
+def _email_block(number, email, body):
+    return f"### Email {number}\nSubject: {email['subject']}\nSnippet: {email['snippet']}\nBody: {body}\n"
+
+def _pack_batches(emails, indices, instructions, bodies):
+    """Groups email indices into batches whose prompts fit the model's context.
+
+    bodies maps each index to its _batch_body.
+    """
+    context_length = _model_context_length or 1_000_000
+    fixed = estimate_tokens(instructions) + estimate_tokens(BATCH_INSTRUCTIONS)
+    batches = []
+    current = []
+    used = fixed
+    for i in indices:
+        cost = estimate_tokens(_email_block(BATCH_MAX_EMAILS, emails[i], bodies[i])) + BATCH_OUTPUT_TOKENS_PER_EMAIL
+        if current and (len(current) >= BATCH_MAX_EMAILS or used + cost > context_length * 0.75):
+            batches.append(current)
+            current = []
+            used = fixed
+        current.append(i)
+        used += cost
+    if current:
+        batches.append(current)
+    return batches
+
+def _parse_batch_response(text, count, categories):
+    """Returns {position: category} for the valid entries of a JSON batch reply."""
+    start, end = text.find("{"), text.rfind("}")
+    if start == -1 or end < start:
+        return {}
+    try:
+        data = json.loads(text[start:end + 1])
+    except json.JSONDecodeError:
+        return {}
+    if not isinstance(data, dict):
+        return {}
+
+    known = {category.lower(): category for category in categories}
+    results = {}
+    for key, value in data.items():
+        try:
+            position = int(key) - 1
+        except ValueError:
+            continue
+        if not 0 <= position < count or not isinstance(value, str):
+            continue
+        value = value.strip().strip("*").strip()
+        # Without a category list in the prompt, accept any non-empty answer
+        category = known.get(value.lower()) if known else value
+        if category:
+            results[position] = category
+    return results
+
+def categorize_emails_batched(emails, concurrency=None, on_result=None, report=True):
+    """Categorizes emails several at a time, in as few requests as fit the context.
+
+    The instructions and category list are sent once per batch instead of
+    once per email. Emails missing from a reply, or answered with an
+    unknown category, are retried one by one with categorize_email.
+    Returns categories in input order; on_result(index, category) is also
+    called for each email as soon as its category is known.
+    """
+    if _client is None:
+        configure_llm()
+    if concurrency is None:
+        concurrency = int(os.getenv("LLM_CONCURRENCY", DEFAULT_CONCURRENCY))
+
+    # The static part of the template (instructions and category list) is
+    # what a batch needs, whether or not LLM_SPLIT_PROMPT sends it apart
+    template, instructions, _ = _load_prompt()
+    categories = parse_categories(template)
+    results = [None] * len(emails)
+
+    # Serve what we can from the prediction cache
+    use_cache = _prediction_cache_enabled()
+    keys = {}
+    if use_cache:
+        cache = get_prediction_cache()
+        # A batch answer comes from a different prompt than categorize_email's
+        # (cut bodies, JSON instructions, other emails alongside), so the two
+        # modes never share cache entries
+        batch_template = f"{template}\0{BATCH_INSTRUCTIONS}\0{BATCH_BODY_TOKENS}"
+        for i, email in enumerate(emails):
+            keys[i] = prediction_key(email["subject"], email["snippet"], email["body"], batch_template, _llm_type, _model_name)
+            results[i] = cache.get(keys[i])
+    pending = [i for i, category in enumerate(results) if category is None]
+    if use_cache:
+        metrics.count("llm_cache_hits", len(emails) - len(pending))
+    if on_result:
+        for i, category in enumerate(results):
+            if category is not None:
+                on_result(i, category)
+
+    def run(batch):
+        blocks = "\n".join(_email_block(n, emails[i], bodies[i]) for n, i in enumerate(batch, 1))
+        prompt = f"{BATCH_INSTRUCTIONS.format(count=len(batch))}\n\n{blocks}"
+        tokens = estimate_tokens(instructions) + estimate_tokens(prompt)
+        _get_rate_limiter().acquire(tokens + BATCH_OUTPUT_TOKENS_PER_EMAIL * len(batch))
+        try:
+            reply = _complete(prompt, system_prompt=instructions, json_output=True)
+            parsed = _parse_batch_response(reply, len(batch), categories)
+        except Exception as e:
+            print(f"Error calling LLM for a batch of {len(batch)} emails: {e}")
+            parsed = {}
+        return batch, parsed, tokens
+
+    bodies = {i: _batch_body(emails[i]) for i in pending}
+    batches = _pack_batches(emails, pending, instructions, bodies)
+    batched_tokens = 0
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+        for batch, parsed, tokens in executor.map(run, batches):
+            batched_tokens += tokens
+            for position, category in parsed.items():
+                i = batch[position]
+                results[i] = category
+                if use_cache:
+                    cache.put(keys[i], category)
+                if on_result:
+                    on_result(i, category)
+            print(f"Batch of {len(batch)} emails: {len(parsed)} categorized")
+
+    retry = [i for i in pending if results[i] is None]
+    if retry:
+        print(f"Retrying {len(retry)} emails one by one...")
+        retried = categorize_emails(
+            [emails[i] for i in retry], concurrency=concurrency, batched=False,
+            on_result=on_result and (lambda j, category: on_result(retry[j], category)), report=False,
+        )
+        for i, category in zip(retry, retried):
+            results[i] = category
+
+    if pending:
+        single_tokens = sum(
+            estimate_tokens(template.format(subject=emails[i]["subject"], snippet=emails[i]["snippet"],
+                                            body=truncate_to_tokens(emails[i]["body"], BATCH_BODY_TOKENS)[0]))
+            for i in pending
+        )
+        print(f"Batched {len(pending)} emails into {len(batches)} requests (+{len(retry)} retries): "
+              f"~{batched_tokens} prompt tokens vs ~{single_tokens} one request per email")
+    if report:
+        report_llm_stats()
+    return results
+
+def categorize_emails(emails, concurrency=None, batched=None, on_result=None, report=True):
+    """Categorizes many emails concurrently and returns categories in input order.
+
+    Runs up to concurrency categorize_email calls at once (LLM_CONCURRENCY in
+    .env, default DEFAULT_CONCURRENCY); the backend's rate limiter paces them.
+    With batched=True (or LLM_BATCH_PROMPTS=true in .env) the work is done by
+    categorize_emails_batched instead.
+
+    on_result(index, category) is called from the calling thread as each
+    email finishes, in completion order; the per-email progress lines are
+    left to it. report=False skips printing the cache and latency summary.
+    """
+    if _client is None:
+        configure_llm()
+    if batched is None:
+        batched = os.getenv("LLM_BATCH_PROMPTS", "false").lower() == "true"
+    if batched:
+        return categorize_emails_batched(emails, concurrency=concurrency, on_result=on_result, report=report)
+    if concurrency is None:
+        concurrency = int(os.getenv("LLM_CONCURRENCY", DEFAULT_CONCURRENCY))
+
+    categories = [None] * len(emails)
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+        futures = {
+            executor.submit(categorize_email, email["subject"], email["snippet"], email["body"]): i
+            for i, email in enumerate(emails)
+        }
+        for done, future in enumerate(as_completed(futures), 1):
+            i = futures[future]
+            categories[i] = future.result()
+            if on_result:
+                on_result(i, categories[i])
+            else:
+                print(f"[{done}/{len(emails)}] {emails[i]['subject'][:60]}... -> {categories[i]}")
+    if report:
+        report_llm_stats()
+    return categories
@@ -0,0 +1,120 @@
+import os
+import sqlite3
+import threading
+import time
+
+MESSAGE_STORE_FILE = "data/message_cache.sqlite3"
+
+# Bump when the parsed fields change shape so stale rows are re-fetched.
+SCHEMA_VERSION = 2
+
+_store = None
+
+class MessageStore:
+    """On-disk cache of parsed Gmail messages, keyed by message ID.
+
+    Stores what fetch_emails returns (headers, snippet, decoded body) plus
+    the message's historyId and the size of the raw API response, so later
+    runs can skip the download and the decoding. Message content never
+    changes in Gmail (only labels do), so an entry stays valid until the
+    message is deleted or the schema version changes. Entries from
+    metadata-only fetches are kept too, but only serve callers that do not
+    need the body. Safe to share between threads.
+    """
+
+    def __init__(self, path=MESSAGE_STORE_FILE):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        # It's only a cache: rebuild it rather than migrate when the schema changes
+        if self._conn.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+            self._conn.execute("DROP TABLE IF EXISTS messages")
+            self._conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS messages (
+                id TEXT PRIMARY KEY,
+                history_id TEXT,
+                subject TEXT,
+                sender TEXT,
+                recipient TEXT,
+                snippet TEXT,
+                body TEXT,
+                has_body INTEGER NOT NULL,
+                raw_bytes INTEGER NOT NULL,
+                fetched_at REAL NOT NULL
+            )
+        """)
+        self._conn.commit()
+        self.hits = 0
+        self.misses = 0
+        self.bytes_saved = 0
+
+    def get_many(self, message_ids, need_body=True):
+        """Returns a dict mapping each cached message ID to its email dict.
+
+        With need_body=False, entries cached from metadata-only fetches count
+        as hits too (their body is empty).
+        """
+        message_ids = list(message_ids)
+        found = {}
+        with self._lock:
+            # Stay under SQLite's bound-parameter limit
+            for start in range(0, len(message_ids), 500):
+                chunk = message_ids[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT id, subject, sender, recipient, snippet, body, raw_bytes FROM messages "
+                    f"WHERE has_body >= ? AND id IN ({placeholders})",
+                    [int(need_body), *chunk],
+                )
+                for message_id, subject, sender, recipient, snippet, body, raw_bytes in rows:
+                    found[message_id] = {
+                        "id": message_id,
+                        "subject": subject,
+                        "sender": sender,
+                        "recipient": recipient,
+                        "snippet": snippet,
+                        "body": body if need_body else "",
+                    }
+                    self.bytes_saved += raw_bytes
+            self.hits += len(found)
+            self.misses += len(message_ids) - len(found)
+        return found
+
+    def put_many(self, entries, has_body=True):
+        """Stores (email dict, history_id, raw_bytes) tuples.
+
+        Entries without a body never replace a cached full message.
+        """
+        now = time.time()
+        verb = "INSERT OR REPLACE" if has_body else "INSERT OR IGNORE"
+        rows = [
+            (email["id"], history_id, email["subject"], email["sender"], email["recipient"],
+             email["snippet"], email["body"], int(has_body), raw_bytes, now)
+            for email, history_id, raw_bytes in entries
+        ]
+        with self._lock:
+            self._conn.executemany(f"{verb} INTO messages VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            self._conn.commit()
+
+    def delete_many(self, message_ids):
+        """Evicts messages, e.g. after Gmail reports them deleted."""
+        with self._lock:
+            self._conn.executemany("DELETE FROM messages WHERE id = ?", [(i,) for i in message_ids])
+            self._conn.commit()
+
+    def report(self):
+        """Prints the session's hit rate and download bytes saved."""
+        total = self.hits + self.misses
+        if total == 0:
+            return
+        print(f"Message cache (this session): {self.hits}/{total} hits ({self.hits / total:.0%}), "
+              f"saved {self.bytes_saved / 1024:.1f} KB of downloads")
+
+def get_message_store():
+    """Returns the session-wide MessageStore."""
+    global _store
+    if _store is None:
+        _store = MessageStore()
+    return _store
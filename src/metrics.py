@@ -0,0 +1,141 @@
+import contextlib
+import json
+import os
+import threading
+import time
+
+# Where export_metrics writes its files; set METRICS_DIR= (empty) in .env to
+# turn the export off
+DEFAULT_METRICS_DIR = "data/metrics"
+# Prefix of every metric name in the Prometheus textfile
+PROMETHEUS_PREFIX = "gmail_organizer_"
+
+_lock = threading.Lock()
+_counters = {}
+_timers = {}
+_started = time.time()
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+def count(name, amount=1, **labels):
+    """Adds amount to the counter name{labels}."""
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + amount
+
+def observe(name, seconds, **labels):
+    """Records one duration for the timer name{labels} (count, total and max)."""
+    key = _key(name, labels)
+    with _lock:
+        timer = _timers.setdefault(key, [0, 0.0, 0.0])
+        timer[0] += 1
+        timer[1] += seconds
+        timer[2] = max(timer[2], seconds)
+
+@contextlib.contextmanager
+def timed(name, **labels):
+    """Times the with-block into name{labels}, whether or not it raises."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - start, **labels)
+
+def stage(name):
+    """Times a pipeline stage's wall time, e.g. ``with metrics.stage("apply"):``."""
+    return timed("stage_seconds", stage=name)
+
+def reset():
+    """Forgets everything recorded so far and restarts the run clock."""
+    global _started
+    with _lock:
+        _counters.clear()
+        _timers.clear()
+        _started = time.time()
+
+def summary():
+    """Returns everything recorded in this run as a JSON-serializable dict."""
+    with _lock:
+        counters = sorted(_counters.items())
+        timers = sorted(_timers.items())
+        started = _started
+    return {
+        "started_at": started,
+        "duration_seconds": time.time() - started,
+        "counters": [{"name": name, "labels": dict(labels), "value": value} for (name, labels), value in counters],
+        "timers": [
+            {"name": name, "labels": dict(labels), "count": n, "total_seconds": total,
+             "avg_seconds": total / n if n else 0.0, "max_seconds": longest}
+            for (name, labels), (n, total, longest) in timers
+        ],
+    }
+
+def _prometheus_labels(labels):
+    if not labels:
+        return ""
+    escape = lambda value: str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+    return "{" + ",".join(f'{key}="{escape(value)}"' for key, value in labels.items()) + "}"
+
+def prometheus_text(data):
+    """Renders a summary() as Prometheus text exposition format.
+
+    Counters get a _total suffix; timers become summaries (_count, _sum)
+    plus a _max gauge. Suited to node_exporter's textfile collector.
+    """
+    lines = []
+    typed = set()
+    def declare(name, kind):
+        if name not in typed:
+            typed.add(name)
+            lines.append(f"# TYPE {name} {kind}")
+
+    for counter in data["counters"]:
+        name = PROMETHEUS_PREFIX + counter["name"].removesuffix("_total") + "_total"
+        declare(name, "counter")
+        lines.append(f"{name}{_prometheus_labels(counter['labels'])} {counter['value']}")
+    # A family's samples must be contiguous, so each timer's _max gauges
+    # follow all of its summary samples
+    timer_names = list(dict.fromkeys(timer["name"] for timer in data["timers"]))
+    for timer_name in timer_names:
+        timers = [timer for timer in data["timers"] if timer["name"] == timer_name]
+        name = PROMETHEUS_PREFIX + timer_name
+        declare(name, "summary")
+        for timer in timers:
+            labels = _prometheus_labels(timer["labels"])
+            lines.append(f"{name}_count{labels} {timer['count']}")
+            lines.append(f"{name}_sum{labels} {timer['total_seconds']:.6f}")
+        declare(name + "_max", "gauge")
+        for timer in timers:
+            lines.append(f"{name}_max{_prometheus_labels(timer['labels'])} {timer['max_seconds']:.6f}")
+    for name, value in (("run_started_timestamp_seconds", data["started_at"]),
+                        ("run_duration_seconds", data["duration_seconds"])):
+        declare(PROMETHEUS_PREFIX + name, "gauge")
+        lines.append(f"{PROMETHEUS_PREFIX}{name} {value:.3f}")
+    return "\n".join(lines) + "\n"
+
+def _write_atomic(path, text):
+    # The textfile collector may read at any moment; never show it half a file
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+def export_metrics(name="organizer", metrics_dir=None):
+    """Writes the run's metrics to <name>_summary.json and <name>.prom in METRICS_DIR.
+
+    Both files are replaced atomically, so each run overwrites the last.
+    Returns the paths written, or None when METRICS_DIR is empty.
+    """
+    if metrics_dir is None:
+        metrics_dir = os.getenv("METRICS_DIR", DEFAULT_METRICS_DIR)
+    if not metrics_dir:
+        return None
+    data = summary()
+    os.makedirs(metrics_dir, exist_ok=True)
+    json_path = os.path.join(metrics_dir, f"{name}_summary.json")
+    prom_path = os.path.join(metrics_dir, f"{name}.prom")
+    _write_atomic(json_path, json.dumps(data, indent=4))
+    _write_atomic(prom_path, prometheus_text(data))
+    print(f"Run metrics written to {json_path} and {prom_path}")
+    return json_path, prom_path
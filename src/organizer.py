@@ -1,14 +1,392 @@
+import atexit
+import json
 import os
+import queue
 import sys
+import threading
 import time
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 
 # Add the current directory to sys.path to allow imports from src
 sys.path.append(os.getcwd())
 
-from src.gmail_client import authenticate, fetch_emails, create_label, apply_label, get_label_id
-from src.llm_client import configure_llm, categorize_email
+from src.gmail_client import (
+    authenticate, find_message_ids, iter_emails, create_label, batch_modify_labels, get_label_id,
+    get_processed_label_name, label_search_name,
+)
+from src import metrics
+from src.llm_client import DEFAULT_CONCURRENCY, configure_llm, categorize_emails, report_llm_stats
+from src.preprocess import preprocess_emails
+from src.review_journal import load_json
+from src.sender_rules import load_sender_rules
+from src.vector_classifier import DEFAULT_MIN_CONFIDENCE, get_vector_classifier, update_vector_index
+from src.verified_store import get_verified_store
 
-def launch_review_and_apply(service, pending_data, pending_file):
+# Emails fetched ahead of categorization; together with the chunk being
+# downloaded, this bounds how many email bodies are held in memory
+PIPELINE_QUEUE_DEPTH = 200
+# Most emails handed to categorize() at a time
+CATEGORIZE_GROUP_SIZE = 20
+
+def apply_labels(service, corrected_data):
+    """Applies each entry's corrected category as a Gmail label.
+
+    Entries are grouped by category so every label goes out as a few chunked
+    batchModify calls instead of one modify call per email. The same calls
+    add the hidden processed-marker label (see get_processed_label_name),
+    which Uncategorized emails get on their own, so later runs can leave
+    all of them out of the Gmail query.
+
+    Returns a dict mapping email ID to the error for emails that failed.
+    """
+    # Group email IDs by target category
+    ids_by_category = {}
+    subjects = {}
+    uncategorized_ids = []
+    for entry in corrected_data:
+        email_id = entry["metadata"]["email_id"]
+        category = entry["training_data"]["output"]
+        subjects[email_id] = entry["metadata"]["subject"]
+
+        if category == "Uncategorized":
+            uncategorized_ids.append(email_id)
+            continue
+        ids_by_category.setdefault(category, []).append(email_id)
+
+    # Get or create the processed marker; without it, emails are only labeled
+    marker_ids = []
+    marker_name = get_processed_label_name()
+    if marker_name:
+        marker_id = get_label_id(service, marker_name) or create_label(service, marker_name, hidden=True)
+        if marker_id:
+            marker_ids = [marker_id]
+        else:
+            print(f"  -> Warning: Could not create marker label {marker_name}")
+
+    failed = {}
+    if marker_ids and uncategorized_ids:
+        failed.update(batch_modify_labels(service, uncategorized_ids, add_label_ids=marker_ids))
+
+    for category, email_ids in ids_by_category.items():
+        # Get or Create Label ID
+        label_id = get_label_id(service, category)
+        if not label_id:
+            print(f"  -> Creating new label: {category}")
+            label_id = create_label(service, category)
+
+        if not label_id:
+            print(f"  -> Error: Could not create label for {category}")
+            for email_id in email_ids:
+                failed[email_id] = f"Could not create label {category}"
+            continue
+
+        errors = batch_modify_labels(service, email_ids, add_label_ids=[label_id, *marker_ids])
+        failed.update(errors)
+        print(f"  -> Applied '{category}' to {len(email_ids) - len(errors)}/{len(email_ids)} emails")
+
+    if failed:
+        print(f"\nFailed to label {len(failed)} emails:")
+        for email_id, error in failed.items():
+            print(f"  -> {subjects.get(email_id, '')[:40]}... ({email_id}): {error}")
+
+    metrics.count("emails_labeled", len(subjects) - len(failed))
+    metrics.count("emails_label_failures", len(failed))
+    return failed
+
+def categorize(emails, on_result=None, report=True, rules=None, sources=None, classifier=None, concurrency=None):
+    """Categorizes emails, only asking the LLM about those the local models can't.
+
+    Sender rules go first, then the vector classifier for emails it is
+    confident about (VECTOR_MIN_CONFIDENCE in .env); the rest go to the
+    LLM. Prints the share of emails each local model served.
+
+    on_result(index, category) is called as soon as each email's category
+    is known. report=False skips the summaries, for callers categorizing a
+    stream of small groups; those can also pass the SenderRules to use, so
+    they aren't rebuilt from the verified store for every group, the
+    VectorClassifier (likewise), a Counter as sources, which adds up how
+    many emails each model served, and the LLM concurrency for the group.
+    """
+    sources = Counter() if sources is None else sources
+    categories = [None] * len(emails)
+    if rules is None:
+        rules = load_sender_rules()
+    if rules is not None and emails:
+        for i, email in enumerate(emails):
+            categories[i] = rules.classify(email["sender"])
+        served = sum(category is not None for category in categories)
+        metrics.count("emails_categorized", served, source="sender_rules")
+        sources["Sender rules"] += served
+        if report:
+            print(f"Sender rules served {served}/{len(emails)} emails ({served / len(emails):.0%}) "
+                  f"using {len(rules)} sender/domain rules")
+
+    remaining = [i for i, category in enumerate(categories) if category is None]
+    if classifier is None:
+        classifier = get_vector_classifier()
+    if classifier is not None and classifier.ready() and remaining:
+        min_confidence = float(os.getenv("VECTOR_MIN_CONFIDENCE", DEFAULT_MIN_CONFIDENCE))
+        served = 0
+        for i, (category, confidence) in zip(remaining, classifier.classify([emails[i] for i in remaining])):
+            if category and confidence >= min_confidence:
+                categories[i] = category
+                served += 1
+        metrics.count("emails_categorized", served, source="vector_classifier")
+        sources["Vector classifier"] += served
+        if report:
+            print(f"Vector classifier served {served}/{len(emails)} emails ({served / len(emails):.0%})")
+        remaining = [i for i, category in enumerate(categories) if category is None]
+
+    if on_result:
+        for i, category in enumerate(categories):
+            if category is not None:
+                on_result(i, category)
+
+    if remaining:
+        metrics.count("emails_categorized", len(remaining), source="llm")
+        sources["LLM"] += len(remaining)
+        # The LLM sees cleaned-up bodies; the dataset keeps the originals
+        llm_categories = categorize_emails(
+            preprocess_emails([emails[i] for i in remaining]),
+            on_result=on_result and (lambda j, category: on_result(remaining[j], category)),
+            report=report,
+            concurrency=concurrency,
+        )
+        for i, category in zip(remaining, llm_categories):
+            categories[i] = category
+    return categories
+
+def pending_entry(email, category):
+    """Builds the pending-file entry (dataset format) for a categorized email."""
+    return {
+        "training_data": {
+            "input": f"Subject: {email['subject']}\nBody: {email['body']}",
+            "output": category
+        },
+        "metadata": {
+            "email_id": email["id"],
+            "subject": email["subject"],
+            "sender": email["sender"],
+            "recipient": email["recipient"],
+            "snippet": email["snippet"],
+            "model_prediction": category,
+            "thumbs_up": False
+        }
+    }
+
+def run_ids_path(stream_file):
+    """Where the message IDs of the run checkpointed in stream_file are kept."""
+    return os.path.splitext(stream_file)[0] + ".ids"
+
+def save_run_ids(stream_file, message_ids):
+    """Records the message IDs a run will categorize, so it can be continued after a crash."""
+    tmp_file = run_ids_path(stream_file) + ".tmp"
+    with open(tmp_file, "w") as f:
+        f.write("".join(f"{message_id}\n" for message_id in message_ids))
+    os.replace(tmp_file, run_ids_path(stream_file))
+
+def load_run_ids(stream_file):
+    """Returns the message IDs of the checkpointed run, in their original order."""
+    with open(run_ids_path(stream_file), "r") as f:
+        return f.read().split()
+
+def append_checkpoint(out, entry):
+    """Appends an entry as one JSON line and forces it to disk.
+
+    The line goes out in a single write, so a crash leaves at most one torn
+    line at the end of the file, which read_checkpoint drops.
+    """
+    out.write(json.dumps(entry) + "\n")
+    out.flush()
+    os.fsync(out.fileno())
+
+def read_checkpoint(stream_file):
+    """Returns {email ID: model prediction} for the entries saved in stream_file.
+
+    A torn last line (from a crash mid-write) is cut off the file, so
+    appending can continue after the last complete entry.
+    """
+    predictions = {}
+    good_size = 0
+    with open(stream_file, "rb") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                break
+            if not line.endswith(b"\n"):
+                break
+            predictions[entry["metadata"]["email_id"]] = entry["training_data"]["output"]
+            good_size += len(line)
+    if good_size != os.path.getsize(stream_file):
+        print(f"Dropping an incomplete entry at the end of {stream_file}")
+        os.truncate(stream_file, good_size)
+    return predictions
+
+def _fetch_stage(service, message_ids, emails_queue):
+    """Downloads emails into emails_queue, then puts None (or the error that stopped it)."""
+    try:
+        with metrics.stage("fetch"):
+            for chunk in iter_emails(service, message_ids):
+                for email in chunk:
+                    emails_queue.put(email)
+        emails_queue.put(None)
+    except Exception as e:
+        emails_queue.put(e)
+
+def run_pipeline(service, message_ids, stream_file, total=None):
+    """Fetches, categorizes and saves emails as a stream.
+
+    A background thread downloads emails into a bounded queue while this
+    thread hands whatever has arrived, in groups, to LLM_CONCURRENCY
+    workers that each categorize one group at a time, so Gmail and LLM
+    calls overlap, the LLM stays busy across groups, and memory is bounded
+    by the queue depth rather than the number of emails. Each categorized
+    email is appended to stream_file as one JSON line as soon as its
+    category is known (see append_checkpoint), and reported with the
+    running throughput; total is the size of the whole
+    run when continuing one. Returns the number of emails saved.
+    """
+    emails_queue = queue.Queue(maxsize=PIPELINE_QUEUE_DEPTH)
+    threading.Thread(target=_fetch_stage, args=(service, message_ids, emails_queue), daemon=True).start()
+    rules = load_sender_rules()
+    classifier = get_vector_classifier()
+    concurrency = max(1, int(os.getenv("LLM_CONCURRENCY", DEFAULT_CONCURRENCY)))
+    sources = Counter()
+
+    total = total or len(message_ids)
+    done = total - len(message_ids)
+    saved = 0
+    start = time.perf_counter()
+    save_lock = threading.Lock()
+    with open(stream_file, "a") as out, ThreadPoolExecutor(max_workers=concurrency) as executor:
+        def save(email, category):
+            nonlocal saved
+            with save_lock:
+                with metrics.stage("checkpoint"):
+                    append_checkpoint(out, pending_entry(email, category))
+                saved += 1
+                rate = saved / (time.perf_counter() - start)
+                subject = email["subject"][:50] + "..." if len(email["subject"]) > 50 else email["subject"]
+                print(f"[{done + saved}/{total}] {subject:<53} | {category} "
+                      f"({rate:.1f} emails/s, {emails_queue.qsize()} fetched ahead)")
+
+        def categorize_group(group):
+            # One LLM request at a time per group; the groups in flight
+            # together make up LLM_CONCURRENCY
+            group_sources = Counter()
+            with metrics.stage("categorize"):
+                categorize(group, on_result=lambda i, category: save(group[i], category), report=False,
+                           rules=rules, sources=group_sources, classifier=classifier, concurrency=1)
+            return group_sources
+
+        in_flight = set()
+        def collect(completed):
+            for future in completed:
+                sources.update(future.result())
+
+        finished = False
+        while not finished:
+            if len(in_flight) >= concurrency:
+                completed, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                collect(completed)
+            # Wait for one email, then take whatever else has already arrived
+            with metrics.stage("wait_for_fetch"):
+                group = [emails_queue.get()]
+            # Spread what has arrived over the workers, so a run's last groups
+            # don't leave most of them idle
+            group_size = min(CATEGORIZE_GROUP_SIZE, -(-(emails_queue.qsize() + 1) // concurrency))
+            while len(group) < group_size and group[-1] is not None and not emails_queue.empty():
+                group.append(emails_queue.get())
+            if isinstance(group[-1], Exception):
+                raise group[-1]
+            if group[-1] is None:
+                finished = True
+                group.pop()
+            if group:
+                in_flight.add(executor.submit(categorize_group, group))
+        collect(wait(in_flight)[0])
+
+    elapsed = time.perf_counter() - start
+    print(f"\nCategorized {saved} emails in {elapsed:.1f}s ({saved / max(elapsed, 1e-9):.1f} emails/s)")
+    categorized = sum(sources.values())
+    for source, served in sources.items():
+        print(f"{source} served {served}/{categorized} emails ({served / max(categorized, 1):.0%})")
+    report_llm_stats()
+    return saved
+
+def finish_stream(stream_file, pending_file):
+    """Converts the streamed JSON lines into pending_file's JSON list.
+
+    Lines are streamed in the order emails finished; the list follows the
+    run's ID list (fetch order) instead. An email categorized again after a
+    resume keeps its latest entry. pending_file is replaced atomically, then
+    stream_file and the run's ID list are removed.
+    """
+    # First pass: where the line with each email's latest entry starts
+    latest = {}
+    with open(stream_file, "rb") as lines:
+        offset = 0
+        for line in lines:
+            if line.strip():
+                latest[json.loads(line)["metadata"]["email_id"]] = offset
+            offset += len(line)
+    order = load_run_ids(stream_file) if os.path.exists(run_ids_path(stream_file)) else []
+    order = [email_id for email_id in dict.fromkeys(order) if email_id in latest]
+    listed = set(order)
+    order += [email_id for email_id in latest if email_id not in listed]
+
+    tmp_file = pending_file + ".tmp"
+    with open(stream_file, "rb") as lines, open(tmp_file, "w") as out:
+        out.write("[")
+        separator = "\n"
+        for email_id in order:
+            lines.seek(latest[email_id])
+            out.write(separator + json.dumps(json.loads(lines.readline()), indent=4))
+            separator = ",\n"
+        out.write("\n]")
+    os.replace(tmp_file, pending_file)
+    os.remove(stream_file)
+    if os.path.exists(run_ids_path(stream_file)):
+        os.remove(run_ids_path(stream_file))
+
+def organize(service, message_ids, pending_file, predictions=None):
+    """Categorizes message_ids into pending_file, then launches review.
+
+    Progress is checkpointed to pending_file + "l" as it goes. predictions
+    ({email ID: category}) are those already checkpointed by an interrupted
+    run; those emails are skipped, except the ones that fell back to
+    Uncategorized (often an LLM error), which are tried again.
+    """
+    stream_file = pending_file + "l"
+    if predictions is None:
+        predictions = {}
+        if os.path.exists(stream_file):
+            os.remove(stream_file)
+        save_run_ids(stream_file, message_ids)
+    remaining = [
+        message_id for message_id in message_ids
+        if predictions.get(message_id) in (None, "Uncategorized")
+    ]
+
+    print("Analyzing emails...")
+    try:
+        with metrics.stage("pipeline"):
+            saved = run_pipeline(service, remaining, stream_file, total=len(message_ids))
+    except (Exception, KeyboardInterrupt) as e:
+        print(f"\nStopped: {str(e) or type(e).__name__}")
+        print(f"Progress so far is saved in {stream_file}; run the organizer again to continue.")
+        return
+    with metrics.stage("save_pending"):
+        finish_stream(stream_file, pending_file)
+    
+    print(f"\nSaved {len(message_ids)} emails to {pending_file} ({saved} categorized this run)")
+    
+    # Launch review and apply
+    launch_review_and_apply(service, pending_file)
+
+def launch_review_and_apply(service, pending_file):
     """Launch Streamlit for review and apply labels after confirmation."""
     # Prompt user to review
     print("=" * 80)
@@ -32,7 +410,8 @@ def launch_review_and_apply(service, pending_data, pending_file):
         print("=" * 80)
         try:
             # Launch Streamlit in foreground so user can interact
-            subprocess.run(["streamlit", "run", "src/data_review_app.py"], check=True)
+            with metrics.stage("review"):
+                subprocess.run(["streamlit", "run", "src/data_review_app.py"], check=True)
         except subprocess.CalledProcessError:
             print("\nStreamlit was closed.")
         except KeyboardInterrupt:
@@ -50,52 +429,31 @@ def launch_review_and_apply(service, pending_data, pending_file):
     print("\nBefore applying labels, let's save your corrections to the verified emails database.")
     print("This builds your ground truth dataset for future fine-tuning.")
     
-    save_confirmed = input("\nSave corrected data to verified_emails.json? (y/n, default y): ").lower()
+    save_confirmed = input("\nSave corrected data to the verified emails? (y/n, default y): ").lower()
     
     if save_confirmed == 'n':
         print(f"Operation cancelled. Your corrections remain in {pending_file}")
         return
     
-    # Save to verified emails
-    import json
-    verified_file = "data/verified_emails.json"
+    # Save to verified emails, with any edits made in the review app
+    verified_store = get_verified_store()
+    verified_store.compact_journal()
     
-    # Reload corrected data from pending file
+    # Reload corrected data from pending file, with edits from the review app
     if not os.path.exists(pending_file):
         print(f"Error: {pending_file} not found. Aborting.")
         return
         
-    with open(pending_file, "r") as f:
-        corrected_data = json.load(f)
-    
-    # Load existing verified emails
-    if os.path.exists(verified_file):
-        with open(verified_file, "r") as f:
-            verified_data = json.load(f)
-    else:
-        verified_data = []
-    
-    # Get existing email IDs to check for duplicates
-    existing_ids = set()
-    for entry in verified_data:
-        if "metadata" in entry and "email_id" in entry["metadata"]:
-            existing_ids.add(entry["metadata"]["email_id"])
-    
-    # Add non-duplicate entries
-    added_count = 0
-    for entry in corrected_data:
-        email_id = entry["metadata"]["email_id"]
-        if email_id not in existing_ids:
-            verified_data.append(entry)
-            existing_ids.add(email_id)
-            added_count += 1
+    corrected_data = load_json(pending_file)
     
-    # Save updated verified emails
-    with open(verified_file, "w") as f:
-        json.dump(verified_data, f, indent=4)
+    # Append non-duplicate entries (the store skips email IDs it already has)
+    with metrics.stage("save_verified"):
+        added_count = verified_store.add_many(corrected_data)
+        if added_count:
+            update_vector_index()
     
     print(f"\nSaved to verified emails: {added_count} new, {len(corrected_data) - added_count} duplicates skipped")
-    print(f"Total verified emails: {len(verified_data)}")
+    print(f"Total verified emails: {len(verified_store)}")
     
     # Now apply to Gmail
     print("\n" + "=" * 60)
@@ -103,7 +461,7 @@ def launch_review_and_apply(service, pending_data, pending_file):
     print("=" * 60)
     confirm = input("\nApply the labels to Gmail now? (y/n): ").lower()
     if confirm != 'y':
-        print(f"Labels not applied. Your verified data is saved in {verified_file}")
+        print(f"Labels not applied. Your verified data is saved in {verified_store.path}")
         return
     
     # Reload the corrected data
@@ -111,45 +469,19 @@ def launch_review_and_apply(service, pending_data, pending_file):
         print(f"Error: {pending_file} not found. Aborting.")
         return
         
-    import json
-    with open(pending_file, "r") as f:
-        corrected_data = json.load(f)
+    corrected_data = load_json(pending_file)
     
     print("\nApplying labels based on your corrections...")
+    with metrics.stage("apply"):
+        apply_labels(service, corrected_data)
     
-    # Cache label IDs to avoid repeated API calls
-    label_cache = {}
-
-    for entry in corrected_data:
-        email_id = entry["metadata"]["email_id"]
-        category = entry["training_data"]["output"]
-        subject = entry["metadata"]["subject"]
-        
-        if category == "Uncategorized":
-            continue
-
-        # Get or Create Label ID
-        if category not in label_cache:
-            label_id = get_label_id(service, category)
-            if not label_id:
-                print(f"  -> Creating new label: {category}")
-                label_id = create_label(service, category)
-            label_cache[category] = label_id
-        
-        label_id = label_cache.get(category)
-        
-        # Apply Label
-        if label_id:
-            apply_label(service, email_id, label_id)
-            print(f"  -> Applied '{category}' to: {subject[:40]}...")
-        else:
-            print(f"  -> Error: Could not create label for {category}")
-            
     print("\nOrganization complete!")
     print(f"\nYou can delete {pending_file} if you're satisfied with the results.")
 
 def main():
     print("--- Gmail Organizer ---")
+    # However the run ends, leave its metrics for the nightly dashboards
+    atexit.register(metrics.export_metrics)
     
     # Setup
     try:
@@ -162,8 +494,27 @@ def main():
     # Authenticate (will prompt for login if token.json is missing/invalid)
     service = authenticate()
     
-    # Check if there's existing pending work
+    # Check for a run that stopped before finishing
     pending_file = "data/pending_organization.json"
+    stream_file = pending_file + "l"
+    if os.path.exists(stream_file) and os.path.exists(run_ids_path(stream_file)):
+        message_ids = load_run_ids(stream_file)
+        predictions = read_checkpoint(stream_file)
+        done = sum(1 for message_id in message_ids if predictions.get(message_id) not in (None, "Uncategorized"))
+        print("\n" + "=" * 80)
+        print("INTERRUPTED RUN FOUND")
+        print("=" * 80)
+        print(f"\n{done} of {len(message_ids)} emails were categorized before the last run stopped.")
+        resume = input("\nDo you want to:\n  1. Continue it (categorize the remaining emails)\n  2. Discard it\nChoice (1/2, default 1): ")
+        
+        if resume != "2":
+            organize(service, message_ids, pending_file, predictions=predictions)
+            return
+        os.remove(stream_file)
+        os.remove(run_ids_path(stream_file))
+        print("\nDiscarded the interrupted run.")
+    
+    # Check if there's existing pending work
     if os.path.exists(pending_file):
         print("\n" + "=" * 80)
         print("EXISTING WORK FOUND")
@@ -175,9 +526,7 @@ def main():
         if resume != "2":
             print("\nResuming from existing data...")
             # Skip to review phase
-            import json
-            with open(pending_file, "r") as f:
-                pending_data = json.load(f)
+            pending_data = load_json(pending_file)
             
             # Clean categories on load (remove markdown formatting like **)
             for entry in pending_data:
@@ -197,7 +546,7 @@ def main():
             print("="*80 + "\n")
             
             # Jump to review phase
-            launch_review_and_apply(service, pending_data, pending_file)
+            launch_review_and_apply(service, pending_file)
             return
         else:
             print("\nStarting fresh analysis...")
@@ -212,82 +561,42 @@ def main():
     print("Choose emails to process:")
     print("1. Unread only (is:unread is:inbox)")
     print("2. All Inbox (is:inbox)")
-    choice = input("Enter choice (1/2, default 1): ")
+    print("3. New in Inbox since last sync (incremental)")
+    choice = input("Enter choice (1/2/3, default 1): ")
     
     query = "is:unread is:inbox"
+    incremental = False
     if choice == "2":
         query = "is:inbox"
+    elif choice == "3":
+        query = "is:inbox"
+        incremental = True
     
-    # Load verified IDs to exclude
+    # Let Gmail skip messages a previous run already labeled
+    marker_name = get_processed_label_name()
+    if marker_name:
+        query += f" -label:{label_search_name(marker_name)}"
+    
+    # Load verified IDs to exclude (just the IDs, not the entries)
     verified_ids = set()
-    verified_file = "data/verified_emails.json"
-    if os.path.exists(verified_file):
-        try:
-            import json
-            with open(verified_file, "r") as f:
-                verified_data = json.load(f)
-                for entry in verified_data:
-                    if "metadata" in entry and "email_id" in entry["metadata"]:
-                        verified_ids.add(entry["metadata"]["email_id"])
-            print(f"Loaded {len(verified_ids)} verified emails to skip.")
-        except Exception as e:
-            print(f"Warning: Could not load verified emails: {e}")
-
-    # Fetch emails
+    try:
+        verified_ids = get_verified_store().ids()
+        print(f"Loaded {len(verified_ids)} verified emails to skip.")
+    except Exception as e:
+        print(f"Warning: Could not load verified emails: {e}")
+
+    # Find the emails to organize
     print(f"Fetching {num_emails} emails with query '{query}'...")
-    emails = fetch_emails(service, query=query, max_results=num_emails, exclude_ids=verified_ids)
+    with metrics.stage("list"):
+        message_ids = find_message_ids(service, query=query, max_results=num_emails, exclude_ids=verified_ids, incremental=incremental)
     
-    if not emails:
+    if not message_ids:
         print("No emails found.")
         return
 
-    print(f"Found {len(emails)} emails to organize.\n")
+    print(f"Found {len(message_ids)} emails to organize.\n")
     
-    # Analyze emails and save to pending file
-    pending_data = []
-    print("Analyzing emails...")
-    for email in emails:
-        print(f"Processing: {email['subject'][:80]}...")
-        category = categorize_email(email["subject"], email["snippet"], email["body"])
-        
-        # Save in dataset format
-        pending_data.append({
-            "training_data": {
-                "input": f"Subject: {email['subject']}\nBody: {email['body']}",
-                "output": category
-            },
-            "metadata": {
-                "email_id": email["id"],
-                "subject": email["subject"],
-                "sender": email["sender"],
-                "recipient": email["recipient"],
-                "snippet": email["snippet"],
-                "model_prediction": category,
-                "thumbs_up": False
-            }
-        })
-        # Rate limiting
-        time.sleep(0.5)
-
-    # Save to pending file
-    import json
-    with open(pending_file, "w") as f:
-        json.dump(pending_data, f, indent=4)
-    
-    print(f"\nSaved {len(pending_data)} emails to {pending_file}")
-    
-    # Show Preview
-    print("\n" + "="*60)
-    print(f"{'SUBJECT':<50} | {'CATEGORY'}")
-    print("-" * 80)
-    for entry in pending_data:
-        subject = entry["metadata"]["subject"][:50] + "..." if len(entry["metadata"]["subject"]) > 50 else entry["metadata"]["subject"]
-        category = entry["training_data"]["output"]
-        print(f"{subject:<50} | {category}")
-    print("="*80 + "\n")
-    
-    # Launch review and apply
-    launch_review_and_apply(service, pending_data, pending_file)
+    organize(service, message_ids, pending_file)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,94 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+PREDICTION_CACHE_FILE = "data/prediction_cache.sqlite3"
+DEFAULT_MAX_ENTRIES = 50000
+
+_cache = None
+
+def _normalize(text):
+    """Collapses whitespace so formatting-only differences share a key."""
+    return " ".join((text or "").split())
+
+def prediction_key(subject, snippet, body, prompt_template, backend, model):
+    """Hashes an email together with everything that can change the LLM's answer.
+
+    Editing the prompt template or switching backend/model yields new keys,
+    so stale predictions are never served.
+    """
+    digest = hashlib.sha256()
+    for part in (_normalize(subject), _normalize(snippet), _normalize(body), prompt_template, backend or "", model or ""):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+class PredictionCache:
+    """Persistent, size-bounded cache of categorize_email results.
+
+    Entries are keyed by prediction_key and evicted least-recently-used
+    once more than max_entries are stored. Safe to share between threads.
+    """
+
+    def __init__(self, path=PREDICTION_CACHE_FILE, max_entries=None):
+        self.path = path
+        if max_entries is None:
+            max_entries = int(os.getenv("PREDICTION_CACHE_MAX_ENTRIES", DEFAULT_MAX_ENTRIES))
+        self.max_entries = max_entries
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS predictions (
+                key TEXT PRIMARY KEY,
+                category TEXT NOT NULL,
+                last_used REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS predictions_last_used ON predictions (last_used)")
+        self._conn.commit()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """Returns the cached category for key, or None."""
+        with self._lock:
+            row = self._conn.execute("SELECT category FROM predictions WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._conn.execute("UPDATE predictions SET last_used = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+            return row[0]
+
+    def put(self, key, category):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO predictions VALUES (?, ?, ?)", (key, category, time.time())
+            )
+            count = self._conn.execute("SELECT COUNT(*) FROM predictions").fetchone()[0]
+            if count > self.max_entries:
+                self._conn.execute(
+                    "DELETE FROM predictions WHERE key IN "
+                    "(SELECT key FROM predictions ORDER BY last_used LIMIT ?)",
+                    (count - self.max_entries,),
+                )
+            self._conn.commit()
+
+    def report(self):
+        """Prints the session's hit/miss counters."""
+        total = self.hits + self.misses
+        if total == 0:
+            return
+        print(f"Prediction cache (this session): {self.hits}/{total} hits ({self.hits / total:.0%}), "
+              f"{self.misses} LLM calls")
+
+def get_prediction_cache():
+    """Returns the session-wide PredictionCache."""
+    global _cache
+    if _cache is None:
+        _cache = PredictionCache()
+    return _cache
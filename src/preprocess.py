@@ -0,0 +1,151 @@
+import os
+import re
+from html.parser import HTMLParser
+from urllib.parse import urlsplit
+
+from src.remove_signature import remove_signature
+
+# Tags whose text is never shown to the reader
+_SKIP_TAGS = {"script", "style", "head", "title", "noscript", "template"}
+# Tags that start a new line when rendered
+_BLOCK_TAGS = {
+    "address", "article", "blockquote", "br", "div", "dl", "dt", "dd", "footer", "h1", "h2", "h3",
+    "h4", "h5", "h6", "header", "hr", "li", "ol", "p", "section", "table", "tr", "ul",
+}
+_HTML_RE = re.compile(r"<(?:!doctype|html|head|body|div|p|table|br|span|a)\b", re.IGNORECASE)
+_URL_RE = re.compile(r"https?://[^\s<>\"')\]]+", re.IGNORECASE)
+_INVISIBLE_RE = re.compile("[\u200b\u200c\u200d\u2060\u034f\ufeff\u00ad]")
+_SPACES_RE = re.compile("[ \t\u00a0\f\v]+")
+_BLANK_LINES_RE = re.compile(r"\n\s*\n\s*\n+")
+# Where quoted reply history starts: "On <date>, <name> wrote:", Outlook's
+# original-message separator or its From:/Sent: header block
+_REPLY_HEADER_RE = re.compile(
+    r"^(?:On\s[^\n]{0,200}?(?:\n[^\n]{0,200}?)?\swrote:\s*$"
+    r"|-{2,}\s*Original Message\s*-{2,}"
+    r"|From:\s[^\n]+\n(?:Sent|Date):\s)",
+    re.IGNORECASE | re.MULTILINE,
+)
+_QUOTED_LINE_RE = re.compile(r"^[ \t]*>[^\n]*\n?", re.MULTILINE)
+# Gmail's and Apple Mail's forward separators; the From:/Date: block after
+# one heads the forwarded email itself, which is what needs categorizing
+_FORWARD_SEPARATOR_RE = re.compile(r"-{2,}\s*Forwarded message\s*-{2,}|Begin forwarded message:", re.IGNORECASE)
+
+# Characters fed to the HTML parser at a time
+HTML_CHUNK_SIZE = 64 * 1024
+
+class _TextExtractor(HTMLParser):
+    """Collects the visible text of an HTML document as it is fed."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts = []
+        self._skip_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in _SKIP_TAGS:
+            self._skip_depth += 1
+        elif tag in _BLOCK_TAGS:
+            self.parts.append("\n")
+        elif tag == "td":
+            self.parts.append(" ")
+
+    def handle_startendtag(self, tag, attrs):
+        if tag in _BLOCK_TAGS:
+            self.parts.append("\n")
+
+    def handle_endtag(self, tag):
+        if tag in _SKIP_TAGS:
+            self._skip_depth = max(0, self._skip_depth - 1)
+        elif tag in _BLOCK_TAGS:
+            self.parts.append("\n")
+
+    def handle_data(self, data):
+        if not self._skip_depth:
+            self.parts.append(data)
+
+def is_html(text):
+    """Whether text looks like an HTML document rather than plain text."""
+    return bool(_HTML_RE.search(text[:2000]))
+
+def html_to_text(html):
+    """Converts HTML to its visible text, feeding the parser in chunks."""
+    parser = _TextExtractor()
+    for start in range(0, len(html), HTML_CHUNK_SIZE):
+        parser.feed(html[start:start + HTML_CHUNK_SIZE])
+    parser.close()
+    return "".join(parser.parts)
+
+def collapse_urls(text):
+    """Replaces each URL with just its domain, e.g. "[link: example.com]"."""
+    def replace(match):
+        netloc = urlsplit(match.group(0)).netloc.lower()
+        return f"[link: {netloc.removeprefix('www.')}]" if netloc else "[link]"
+    return _URL_RE.sub(replace, text)
+
+def _follows_forward_separator(text, start):
+    previous_line = text[:start].rstrip().rpartition("\n")[2]
+    return bool(_FORWARD_SEPARATOR_RE.fullmatch(previous_line.strip()))
+
+def strip_quoted_replies(text):
+    """Drops quoted reply history: "> " lines and everything after a reply header.
+
+    The header block of a forwarded message is not a reply header, so
+    forwarded content is kept.
+    """
+    for match in _REPLY_HEADER_RE.finditer(text):
+        if _follows_forward_separator(text, match.start()):
+            continue
+        # A reply header on the first line is all we have, so keep it
+        if text[:match.start()].strip():
+            text = text[:match.start()]
+        break
+    return _QUOTED_LINE_RE.sub("", text)
+
+def preprocess_body(body):
+    """Shrinks an email body to the text that matters for categorization.
+
+    Converts HTML to text, strips quoted replies and the signature, collapses
+    URLs to their domain and squeezes whitespace.
+    """
+    if not body:
+        return ""
+    text = html_to_text(body) if is_html(body) else body
+    text = _INVISIBLE_RE.sub("", text)
+    text = strip_quoted_replies(text)
+    text, _ = remove_signature(text)
+    text = collapse_urls(text)
+    text = _SPACES_RE.sub(" ", text)
+    text = "\n".join(line.strip() for line in text.split("\n"))
+    text = _BLANK_LINES_RE.sub("\n\n", text)
+    return text.strip()
+
+def preprocessing_enabled():
+    return os.getenv("PREPROCESS_BODIES", "true").lower() == "true"
+
+def preprocess_emails(emails):
+    """Returns copies of emails with preprocessed bodies, for sending to the LLM.
+
+    The originals are left untouched so the raw body can still be saved to
+    the dataset. Prints the estimated tokens saved per email and in total.
+    Does nothing when PREPROCESS_BODIES=false.
+    """
+    if not preprocessing_enabled():
+        return emails
+
+    # Same ~4 characters per token estimate the LLM client uses
+    tokens = lambda text: len(text) // 4 + 1
+    processed = []
+    before_total = after_total = 0
+    for email in emails:
+        body = preprocess_body(email["body"])
+        before, after = tokens(email["body"]), tokens(body)
+        before_total += before
+        after_total += after
+        print(f"Preprocessed: {email['subject'][:50]}... ~{before} -> ~{after} tokens")
+        processed.append({**email, "body": body})
+
+    if emails:
+        saved = before_total - after_total
+        print(f"Preprocessing saved ~{saved} body tokens "
+              f"({saved / max(before_total, 1):.0%}, ~{saved // len(emails)} per email)")
+    return processed
@@ -1,5 +1,99 @@
+import functools
 import re
 
+# Patterns for signature detection. Delimiters and the Markdown image all
+# start with a newline, written once in _FIRST_MATCH_PATTERN so the
+# alternatives aren't tried one by one at every newline; "-{3,}\s*$" also
+# covers "-{3,}\s*\n".
+_DELIMITERS = r'\s*(?:--\s*\n|={3,}\s*\n|_{3,}\s*\n|\*{3,}\s*\n|-{3,}\s*$)'
+
+_CLOSINGS = {
+    # English - allow leading whitespace
+    'en': r'Best regards?|Regards?|Kind regards?|Warm regards?|Brgds?|Cheers|Thanks?|Thank you|Many thanks|Sincerely|Cordially|Warmly|Best|Sent from my .*?',
+    # French
+    'fr': r'Cordialement|Bien cordialement|Salutations|Meilleures salutations|Amicalement|Merci|Bien à vous|Respectueusement',
+    # German
+    'de': r'Mit freundlichen Grüßen|Freundliche Grüße|Viele Grüße|Herzliche Grüße|Beste Grüße',
+    # Italian
+    'it': r'Cordiali saluti|Distinti saluti|Saluti|Grazie|Un saluto|Cari saluti',
+    # Dutch
+    'nl': r'Met vriendelijke groet|Vriendelijke groeten|Hartelijke groeten|Groeten',
+    # Luxembourgish
+    'lb': r'Mat frëndleche Gréiss|Frëndlech Gréiss|Villmools Merci|Merci',
+}
+
+_MARKDOWN = r'\n\s*!\[.*?\]\(.*?\)'  # Markdown image after blank line
+
+# Phrases start with a letter, so the leading whitespace never needs to backtrack
+_CLOSING_TEMPLATE = r'\n\s*+(?:{})\s*,?\s*(?=\n|$)'
+
+# Only the first delimiter or Markdown image matters, so one alternation
+# searched once finds the earliest of them.
+_FIRST_MATCH_PATTERN = re.compile(rf"\n(?:{_DELIMITERS}|(?s:{_MARKDOWN}))", re.MULTILINE)
+
+# Per-language closing patterns, used to place each language's matches
+_CLOSING_PATTERNS = {
+    lang: re.compile(_CLOSING_TEMPLATE.format(alts), re.IGNORECASE | re.MULTILINE)
+    for lang, alts in _CLOSINGS.items()
+}
+
+# Any closing line in any language, found in one pass; "line" captures the
+# phrase's line so the languages accepting it can be looked up
+_ANY_CLOSING_PATTERN = re.compile(
+    _CLOSING_TEMPLATE.format("(?=(?P<line>[^\n]*))(?:{})".format("|".join(_CLOSINGS.values()))),
+    re.IGNORECASE | re.MULTILINE,
+)
+
+
+@functools.lru_cache(maxsize=4096)
+def _closing_languages(line):
+    """Languages whose closing pattern accepts a line starting with a phrase.
+
+    Whether a closing matches depends only on the rest of the phrase's line
+    (the phrase plus trailing whitespace and an optional comma), so the
+    answer can be cached by line.
+    """
+    return tuple(lang for lang, pattern in _CLOSING_PATTERNS.items() if pattern.match("\n" + line + "\n"))
+
+
+def _last_closing_starts(text):
+    """Returns, per language, where its last closing phrase match starts.
+
+    Equivalent to running each language's pattern through finditer and
+    keeping the last match, but scans the text once. A closing match is
+    "\n", whitespace, the phrase, then trailing whitespace; it can start at
+    any newline in the whitespace before the phrase, and a left-to-right
+    scan picks the first newline not consumed by that language's previous
+    match. Walking the closing lines from the right, each language is
+    settled by its last line and, at most, the line just before it.
+    """
+    matches = list(_ANY_CLOSING_PATTERN.finditer(text))
+    # Stop walking once every language that appears at all is settled
+    present = set().union(*map(_closing_languages, {m["line"] for m in matches}))
+
+    last_start = {}
+    for i in range(len(matches) - 1, -1, -1):
+        if len(last_start) == len(present):
+            break
+        phrase_start = matches[i].start("line")
+        for lang in _closing_languages(matches[i]["line"]):
+            if lang in last_start:
+                continue
+            run_start = phrase_start
+            while run_start > 0 and text[run_start - 1].isspace():
+                run_start -= 1
+            start = text.index("\n", run_start, phrase_start)
+
+            # The previous match of this language may have consumed the
+            # leading newlines, in which case this one starts where it ended
+            if i > 0 and lang in _closing_languages(matches[i - 1]["line"]):
+                previous_end = _CLOSING_PATTERNS[lang].match(text, matches[i - 1].start()).end()
+                if run_start <= previous_end < phrase_start:
+                    start = previous_end
+            last_start[lang] = start
+
+    return list(last_start.values())
+
 
 def remove_signature(text: str) -> tuple[str, str]:
     """
@@ -20,55 +114,15 @@ def remove_signature(text: str) -> tuple[str, str]:
     if not text:
         return "", ""
 
-    # Patterns for signature detection
-    patterns = {
-        'delimiters': [
-            r'\n\s*--\s*\n',
-            r'\n\s*={3,}\s*\n',
-            r'\n\s*_{3,}\s*\n',
-            r'\n\s*-{3,}\s*\n',
-            r'\n\s*\*{3,}\s*\n',
-            r'\n\s*-{3,}\s*$',  # delimiter at end
-        ],
-        'closings': [
-            # English - allow leading whitespace
-            r'\n\s*(?:Best regards?|Regards?|Kind regards?|Warm regards?|Brgds?|Cheers|Thanks?|Thank you|Many thanks|Sincerely|Cordially|Warmly|Best|Sent from my .*?)\s*,?\s*(?=\n|$)',
-            # French
-            r'\n\s*(?:Cordialement|Bien cordialement|Salutations|Meilleures salutations|Amicalement|Merci|Bien à vous|Respectueusement)\s*,?\s*(?=\n|$)',
-            # German
-            r'\n\s*(?:Mit freundlichen Grüßen|Freundliche Grüße|Viele Grüße|Herzliche Grüße|Beste Grüße)\s*,?\s*(?=\n|$)',
-            # Italian
-            r'\n\s*(?:Cordiali saluti|Distinti saluti|Saluti|Grazie|Un saluto|Cari saluti)\s*,?\s*(?=\n|$)',
-            # Dutch
-            r'\n\s*(?:Met vriendelijke groet|Vriendelijke groeten|Hartelijke groeten|Groeten)\s*,?\s*(?=\n|$)',
-            # Luxembourgish
-            r'\n\s*(?:Mat frëndleche Gréiss|Frëndlech Gréiss|Villmools Merci|Merci)\s*,?\s*(?=\n|$)',
-        ],
-        'markdown': [
-            r'\n\n\s*!\[.*?\]\(.*?\)',  # Markdown image after blank line
-        ]
-    }
-
-    # Find all possible signature start positions
+    # Delimiters and Markdown images count from their first occurrence
     candidates = []
+    match = _FIRST_MATCH_PATTERN.search(text)
+    if match:
+        candidates.append(match.start())
 
-    for pattern_str in patterns['delimiters']:
-        pattern = re.compile(pattern_str, re.MULTILINE)
-        for match in pattern.finditer(text):
-            candidates.append(match.start())
-
-    # Check closing phrases - use LAST match to avoid false positives
-    for pattern_str in patterns['closings']:
-        pattern = re.compile(pattern_str, re.IGNORECASE | re.MULTILINE)
-        matches = list(pattern.finditer(text))
-        if matches:
-            candidates.append(matches[-1].start())
-
-    # Check markdown patterns
-    for pattern_str in patterns['markdown']:
-        pattern = re.compile(pattern_str, re.IGNORECASE | re.MULTILINE | re.DOTALL)
-        for match in pattern.finditer(text):
-            candidates.append(match.start())
+    # Closing phrases count from their LAST occurrence per language, to avoid
+    # false positives
+    candidates.extend(_last_closing_starts(text))
 
     # Use the earliest position found
     if candidates:
@@ -0,0 +1,115 @@
+import json
+import os
+import threading
+
+# Patches kept in a journal before it is folded into its dataset
+COMPACT_AFTER = 50
+
+_lock = threading.Lock()
+_compacting = set()
+
+def journal_path(path):
+    return path + ".journal"
+
+def _base_token(path):
+    """Identifies the version of a JSON dataset that patches were made against.
+
+    JSON datasets are rewritten as a whole (by compaction or by the organizer
+    starting a fresh run), which makes older patches stale. Entries in the
+    verified store are updated in place, so its patches never go stale.
+    """
+    if not path.endswith(".json") or not os.path.exists(path):
+        return None
+    stat = os.stat(path)
+    return [stat.st_mtime_ns, stat.st_size]
+
+def append_patches(path, patches):
+    """Records edited entries ({index: entry}) for the dataset at path.
+
+    Appends one line per entry to the dataset's journal, so saving an edit
+    costs the same however large the dataset is. Returns the number of
+    patches now waiting to be compacted.
+    """
+    with _lock:
+        token = _base_token(path)
+        with open(journal_path(path), "a") as f:
+            for index, entry in patches.items():
+                f.write(json.dumps({"base": token, "index": index, "entry": entry}) + "\n")
+        with open(journal_path(path), "r") as f:
+            return sum(1 for _ in f)
+
+def read_patches(path):
+    """Returns the journaled edits for the dataset at path as {index: entry}.
+
+    Later patches win, and patches made against an older version of a JSON
+    dataset are skipped.
+    """
+    token = _base_token(path)
+    patches = {}
+    if not os.path.exists(journal_path(path)):
+        return patches
+    with open(journal_path(path), "r") as f:
+        for line in f:
+            try:
+                patch = json.loads(line)
+            except json.JSONDecodeError:
+                # A write cut short by a crash; everything before it is intact
+                continue
+            if patch["base"] == token:
+                patches[patch["index"]] = patch["entry"]
+    return patches
+
+def apply_patches(data, patches):
+    """Applies {index: entry} patches to a loaded dataset list in place."""
+    for index, entry in patches.items():
+        if 0 <= index < len(data):
+            data[index] = entry
+    return data
+
+def load_json(path):
+    """Loads a JSON dataset with its journaled edits applied."""
+    with open(path, "r") as f:
+        data = json.load(f)
+    return apply_patches(data, read_patches(path))
+
+def compact(path, save):
+    """Folds the journal of the dataset at path into the dataset itself.
+
+    save(patches) writes the patches to the dataset, then the journal is
+    deleted. A crash in between is harmless: a rewritten JSON dataset makes
+    the old patches stale, and store updates can safely be applied twice.
+    Edits saved while this runs wait for it, so none are lost.
+    """
+    with _lock:
+        if not os.path.exists(journal_path(path)):
+            return
+        save(read_patches(path))
+        os.remove(journal_path(path))
+
+def save_json_patches(path, patches):
+    """Writes patches into a JSON dataset, replacing the file atomically."""
+    with open(path, "r") as f:
+        data = json.load(f)
+    apply_patches(data, patches)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f, indent=4)
+    os.replace(tmp_path, path)
+
+def compact_in_background(path, save):
+    """Runs compact(path, save) on a daemon thread, unless one is already running for path."""
+    with _lock:
+        if path in _compacting:
+            return
+        _compacting.add(path)
+
+    def run():
+        try:
+            compact(path, save)
+        except Exception as e:
+            print(f"Error compacting {journal_path(path)}: {e}")
+        finally:
+            with _lock:
+                _compacting.discard(path)
+
+    threading.Thread(target=run, daemon=True).start()
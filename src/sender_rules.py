@@ -0,0 +1,75 @@
+import functools
+import os
+from collections import Counter, defaultdict
+from email.utils import parseaddr
+
+from src.verified_store import get_verified_store
+
+# A sender (or domain) needs this many verified emails...
+DEFAULT_MIN_SUPPORT = 5
+# ...and this share of them in one category before the rule is trusted
+DEFAULT_MIN_PURITY = 0.95
+
+# The same few senders come up again and again, and parseaddr is slow
+@functools.lru_cache(maxsize=65536)
+def parse_sender(sender):
+    """Returns the lowercased address and domain of a From header, e.g. ("a@b.com", "b.com")."""
+    address = parseaddr(sender or "")[1].lower()
+    domain = address.rpartition("@")[2] if "@" in address else ""
+    return address, domain
+
+def sender_rules_enabled():
+    return os.getenv("SENDER_RULES", "true").lower() == "true"
+
+class SenderRules:
+    """Categorizes emails by sender address or domain, from verified labels.
+
+    Counts the verified categories per sender address and per domain. A
+    sender whose emails were verified at least min_support times, with at
+    least min_purity of them in one category, gets that category without
+    asking the LLM; otherwise the sender's domain is tried the same way.
+    """
+
+    def __init__(self, sender_labels, min_support=None, min_purity=None):
+        if min_support is None:
+            min_support = int(os.getenv("SENDER_RULES_MIN_SUPPORT", DEFAULT_MIN_SUPPORT))
+        if min_purity is None:
+            min_purity = float(os.getenv("SENDER_RULES_MIN_PURITY", DEFAULT_MIN_PURITY))
+
+        by_address = defaultdict(Counter)
+        by_domain = defaultdict(Counter)
+        for sender, category in sender_labels:
+            category = (category or "").strip("*").strip()
+            if not category:
+                continue
+            address, domain = parse_sender(sender)
+            if address:
+                by_address[address][category] += 1
+            if domain:
+                by_domain[domain][category] += 1
+
+        def confident(counts):
+            rules = {}
+            for key, counter in counts.items():
+                category, count = counter.most_common(1)[0]
+                total = counter.total()
+                if total >= min_support and count / total >= min_purity:
+                    rules[key] = category
+            return rules
+
+        self.address_rules = confident(by_address)
+        self.domain_rules = confident(by_domain)
+
+    def classify(self, sender):
+        """Returns the category for a From header, or None if no rule is confident."""
+        address, domain = parse_sender(sender)
+        return self.address_rules.get(address) or self.domain_rules.get(domain)
+
+    def __len__(self):
+        return len(self.address_rules) + len(self.domain_rules)
+
+def load_sender_rules():
+    """Builds SenderRules from the verified store, or returns None when SENDER_RULES=false."""
+    if not sender_rules_enabled():
+        return None
+    return SenderRules(get_verified_store().sender_labels())
@@ -0,0 +1,216 @@
+import json
+import os
+import re
+import zlib
+
+import numpy as np
+
+from src.sender_rules import parse_sender
+from src.verified_store import get_verified_store
+
+VECTOR_INDEX_DIR = "data/vector_index"
+# Number of hashed feature buckets (a power of two)
+HASH_DIM = 2 ** 16
+# Only the start of long bodies is used
+MAX_TEXT_CHARS = 4000
+# Below this many verified emails the centroids are too noisy to trust
+MIN_TRAINING_EMAILS = 50
+DEFAULT_MIN_CONFIDENCE = 0.5
+# Emails scored per matrix product
+CLASSIFY_BATCH_SIZE = 256
+
+_TOKEN_RE = re.compile(r"[a-z0-9][a-z0-9'_.-]{1,30}")
+
+_classifier = None
+
+def vector_classifier_enabled():
+    return os.getenv("VECTOR_CLASSIFIER", "true").lower() == "true"
+
+def _features(text, sender):
+    """Returns (bucket indices, 1 + log term counts) for an email's words and sender."""
+    tokens = _TOKEN_RE.findall((text or "")[:MAX_TEXT_CHARS].lower())
+    address, domain = parse_sender(sender)
+    if address:
+        tokens += [f"from:{address}", f"domain:{domain}"]
+    # crc32 rather than hash(), which differs between Python processes
+    buckets = np.fromiter((zlib.crc32(token.encode()) for token in tokens), dtype=np.int64, count=len(tokens))
+    buckets, counts = np.unique(buckets & (HASH_DIM - 1), return_counts=True)
+    return buckets, 1 + np.log(counts)
+
+class VectorClassifier:
+    """Nearest-centroid classifier over hashed TF-IDF vectors of verified emails.
+
+    Each email's words (and sender address/domain) are hashed into HASH_DIM
+    buckets. The index keeps, per category, the sum of its emails'
+    normalized term-frequency vectors, plus the document frequency of every
+    bucket; IDF weights are applied when classifying, so adding emails
+    never requires revisiting older ones. The arrays are saved as .npy files
+    in index_dir and memory-mapped on load.
+
+    Only entries added to the store after the last update are read by
+    update(), unless entries were relabeled since (the store's
+    update_count() changed), in which case the index is rebuilt.
+    """
+
+    def __init__(self, index_dir=VECTOR_INDEX_DIR):
+        self.index_dir = index_dir
+        self.labels = []
+        self.centroids = np.zeros((0, HASH_DIM), dtype=np.float32)
+        self.doc_freq = np.zeros(HASH_DIM, dtype=np.int32)
+        self.num_docs = 0
+        self.last_seq = 0
+        self.store_updates = None
+        self._weighted = None
+
+        meta_file = os.path.join(index_dir, "meta.json")
+        if os.path.exists(meta_file):
+            with open(meta_file, "r") as f:
+                meta = json.load(f)
+            if meta.get("dim") == HASH_DIM:
+                self.labels = meta["labels"]
+                self.num_docs = meta["num_docs"]
+                self.last_seq = meta["last_seq"]
+                self.store_updates = meta.get("store_updates")
+                self.centroids = np.load(os.path.join(index_dir, "centroids.npy"), mmap_mode="r")
+                self.doc_freq = np.load(os.path.join(index_dir, "doc_freq.npy"), mmap_mode="r")
+
+    def update(self, store=None):
+        """Adds verified entries saved since the last update, then saves the index.
+
+        Rebuilds it from scratch instead when stored entries were edited since.
+        Returns the number of entries added.
+        """
+        store = store or get_verified_store()
+        updates = store.update_count()
+        if updates != self.store_updates:
+            # Edited entries' old labels are summed into the centroids
+            self._clear()
+            self.store_updates = updates
+        new = list(store.entries_since(self.last_seq))
+        if not new:
+            return 0
+
+        # Loaded arrays are read-only memory maps
+        centroids = {label: np.array(row) for label, row in zip(self.labels, self.centroids)}
+        doc_freq = np.array(self.doc_freq)
+        for seq, entry in new:
+            self.last_seq = seq
+            training = entry.get("training_data", {})
+            label = (training.get("output") or "").strip("*").strip()
+            if not label:
+                continue
+            buckets, weights = _features(training.get("input"), entry.get("metadata", {}).get("sender"))
+            if not len(buckets):
+                continue
+            if label not in centroids:
+                centroids[label] = np.zeros(HASH_DIM, dtype=np.float32)
+            centroids[label][buckets] += weights / np.linalg.norm(weights)
+            doc_freq[buckets] += 1
+            self.num_docs += 1
+
+        self.labels = sorted(centroids)
+        self.centroids = np.array([centroids[label] for label in self.labels], dtype=np.float32).reshape(-1, HASH_DIM)
+        self.doc_freq = doc_freq
+        self._weighted = None
+        self.save()
+        return len(new)
+
+    def _clear(self):
+        self.labels = []
+        self.centroids = np.zeros((0, HASH_DIM), dtype=np.float32)
+        self.doc_freq = np.zeros(HASH_DIM, dtype=np.int32)
+        self.num_docs = 0
+        self.last_seq = 0
+        self._weighted = None
+
+    def rebuild(self, store=None):
+        """Rebuilds the index from every verified entry."""
+        self._clear()
+        return self.update(store)
+
+    def save(self):
+        """Writes the index files, each replaced atomically."""
+        os.makedirs(self.index_dir, exist_ok=True)
+        for name, array in (("centroids", self.centroids), ("doc_freq", self.doc_freq)):
+            tmp_file = os.path.join(self.index_dir, f"{name}.tmp.npy")
+            np.save(tmp_file, array)
+            os.replace(tmp_file, os.path.join(self.index_dir, f"{name}.npy"))
+        # meta.json goes last: it names the state the arrays are in
+        tmp_file = os.path.join(self.index_dir, "meta.json.tmp")
+        with open(tmp_file, "w") as f:
+            json.dump({"dim": HASH_DIM, "labels": self.labels, "num_docs": self.num_docs, "last_seq": self.last_seq,
+                       "store_updates": self.store_updates}, f)
+        os.replace(tmp_file, os.path.join(self.index_dir, "meta.json"))
+
+    def ready(self):
+        """Whether enough verified emails (in at least two categories) have been indexed."""
+        return self.num_docs >= MIN_TRAINING_EMAILS and len(self.labels) >= 2
+
+    def _idf_and_centroids(self):
+        if self._weighted is None:
+            idf = (np.log((self.num_docs + 1) / (np.asarray(self.doc_freq) + 1)) + 1).astype(np.float32)
+            weighted = np.asarray(self.centroids) * idf
+            weighted /= np.maximum(np.linalg.norm(weighted, axis=1, keepdims=True), 1e-12)
+            self._weighted = idf, weighted
+        return self._weighted
+
+    def classify(self, emails):
+        """Returns (category, confidence) for each email dict, in input order.
+
+        Confidence is how far the best category's cosine similarity is ahead
+        of the runner-up, relative to the best: 0 when they tie, 1 when the
+        email is similar to only one category.
+        """
+        if not self.labels or not emails:
+            return [(None, 0.0)] * len(emails)
+        idf, weighted = self._idf_and_centroids()
+
+        results = []
+        for start in range(0, len(emails), CLASSIFY_BATCH_SIZE):
+            batch = emails[start:start + CLASSIFY_BATCH_SIZE]
+            features = [
+                _features(f"Subject: {email['subject']}\nBody: {email['body']}", email.get("sender"))
+                for email in batch
+            ]
+            # Only the buckets some email in the batch uses take part in the product
+            columns, positions = np.unique(np.concatenate([buckets for buckets, _ in features]), return_inverse=True)
+            queries = np.zeros((len(batch), len(columns)), dtype=np.float32)
+            offset = 0
+            for row, (buckets, weights) in enumerate(features):
+                queries[row, positions[offset:offset + len(buckets)]] = weights
+                offset += len(buckets)
+            queries *= idf[columns]
+            queries /= np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+
+            similarities = queries @ weighted[:, columns].T
+            order = np.argsort(-similarities, axis=1)
+            best = similarities[np.arange(len(batch)), order[:, 0]]
+            if len(self.labels) > 1:
+                runner_up = similarities[np.arange(len(batch)), order[:, 1]]
+            else:
+                runner_up = np.zeros(len(batch), dtype=np.float32)
+            confidence = np.where(best > 0, (best - runner_up) / np.maximum(best, 1e-12), 0.0)
+            results.extend(
+                (self.labels[i] if score > 0 else None, float(c))
+                for i, score, c in zip(order[:, 0], best, confidence)
+            )
+        return results
+
+def get_vector_classifier():
+    """Returns the session-wide VectorClassifier, brought up to date with the store.
+
+    Returns None when VECTOR_CLASSIFIER=false.
+    """
+    global _classifier
+    if not vector_classifier_enabled():
+        return None
+    if _classifier is None:
+        _classifier = VectorClassifier()
+    _classifier.update()
+    return _classifier
+
+def update_vector_index():
+    """Adds newly saved verified entries to the index, if the classifier is enabled."""
+    classifier = get_vector_classifier()
+    if classifier is not None:
+        print(f"Vector index: {classifier.num_docs} verified emails in {len(classifier.labels)} categories")
@@ -0,0 +1,212 @@
+import json
+import os
+import sqlite3
+import threading
+
+from src.review_journal import compact
+
+VERIFIED_STORE_FILE = "data/verified_emails.sqlite3"
+# Where the dataset lived before the store; imported once, then renamed
+LEGACY_VERIFIED_FILE = "data/verified_emails.json"
+
+_store = None
+
+def entry_email_id(entry):
+    """Returns an entry's email ID, for both the nested and the old flat format."""
+    if "metadata" in entry:
+        return entry["metadata"].get("email_id")
+    return entry.get("email_id") or entry.get("id")
+
+def normalize_entry(entry):
+    """Converts an old flat-format entry to the nested training_data/metadata format."""
+    if "metadata" in entry and "training_data" in entry:
+        return entry
+    return {
+        "training_data": entry.get("training_data") or {
+            "input": f"Subject: {entry.get('subject')}\nSnippet: {entry.get('snippet')}",
+            "output": entry.get("user_label"),
+        },
+        "metadata": entry.get("metadata") or {
+            "email_id": entry_email_id(entry),
+            "subject": entry.get("subject"),
+            "sender": entry.get("sender", "Unknown"),
+            "recipient": entry.get("recipient", "Unknown"),
+            "snippet": entry.get("snippet"),
+            "model_prediction": entry.get("llm_prediction"),
+            "thumbs_up": entry.get("thumbs_up"),
+        },
+    }
+
+class VerifiedStore:
+    """Append-only store of verified dataset entries, indexed by email ID.
+
+    Entries keep the format verified_emails.json used (training_data plus
+    metadata) and are stored one row each, so adding an entry is a single
+    insert instead of rewriting the whole dataset, and every write is an
+    atomic transaction. Iteration streams entries in insertion order. On
+    first use an existing verified_emails.json is imported and renamed to
+    verified_emails.json.migrated. Safe to share between threads.
+
+    The email IDs are also kept in a plain-text sidecar (one per line, next
+    to the database) that is appended to on every insert, so ids() can
+    build the exclusion set without touching the entries.
+    """
+
+    def __init__(self, path=VERIFIED_STORE_FILE, legacy_file=LEGACY_VERIFIED_FILE):
+        self.path = path
+        self.ids_path = os.path.splitext(path)[0] + ".ids"
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        # Readers (e.g. the review app) don't block the organizer's writes
+        self._conn.execute("PRAGMA journal_mode = WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS entries (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                email_id TEXT UNIQUE,
+                entry TEXT NOT NULL
+            )
+        """)
+        # Counts update_many calls, so derived indexes can tell entries were edited
+        self._conn.execute("CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+        self._conn.commit()
+        if legacy_file and os.path.exists(legacy_file):
+            self.migrate(legacy_file)
+
+    def migrate(self, legacy_file):
+        """Imports a verified_emails.json dataset, then renames the file.
+
+        Flat-format entries are converted to the nested format; entries whose
+        email ID is already stored are skipped. Returns the number imported.
+        """
+        with open(legacy_file, "r") as f:
+            data = json.load(f)
+        added = self.add_many(normalize_entry(entry) for entry in data)
+        os.replace(legacy_file, legacy_file + ".migrated")
+        print(f"Migrated {added} verified emails from {legacy_file} to {self.path} "
+              f"(original kept as {legacy_file}.migrated)")
+        return added
+
+    def add(self, entry):
+        """Appends an entry unless its email ID is already stored. Returns whether it was added."""
+        return self.add_many([entry]) == 1
+
+    def add_many(self, entries):
+        """Appends entries in one transaction, skipping stored email IDs. Returns the number added."""
+        added_ids = []
+        added = 0
+        with self._lock:
+            with self._conn:
+                for entry in entries:
+                    email_id = entry_email_id(entry)
+                    cursor = self._conn.execute(
+                        "INSERT OR IGNORE INTO entries (email_id, entry) VALUES (?, ?)", (email_id, json.dumps(entry))
+                    )
+                    if cursor.rowcount:
+                        added += 1
+                        if email_id is not None:
+                            added_ids.append(email_id)
+            if added_ids and os.path.exists(self.ids_path):
+                with open(self.ids_path, "a") as f:
+                    f.write("".join(f"{email_id}\n" for email_id in added_ids))
+        return added
+
+    def ids(self):
+        """Returns the set of stored email IDs, read from the ID sidecar.
+
+        The sidecar is checked against the store's ID count and rebuilt from
+        the email_id index if it is missing or out of step (e.g. after a
+        crash between the insert and the append).
+        """
+        with self._lock:
+            count = self._conn.execute("SELECT COUNT(email_id) FROM entries").fetchone()[0]
+            ids = set()
+            if os.path.exists(self.ids_path):
+                with open(self.ids_path, "r") as f:
+                    ids = set(f.read().split())
+            if len(ids) != count:
+                ids = {row[0] for row in self._conn.execute("SELECT email_id FROM entries WHERE email_id IS NOT NULL")}
+                tmp_path = self.ids_path + ".tmp"
+                with open(tmp_path, "w") as f:
+                    f.write("".join(f"{email_id}\n" for email_id in sorted(ids)))
+                os.replace(tmp_path, self.ids_path)
+            return ids
+
+    def update_many(self, entries):
+        """Replaces stored entries in one transaction, matched by email ID.
+
+        Also bumps update_count(), in the same transaction.
+        """
+        rows = [(json.dumps(entry), entry_email_id(entry)) for entry in entries]
+        with self._lock, self._conn:
+            self._conn.executemany("UPDATE entries SET entry = ? WHERE email_id = ?", rows)
+            self._conn.execute(
+                "INSERT INTO counters (name, value) VALUES ('updates', 1) "
+                "ON CONFLICT (name) DO UPDATE SET value = value + 1"
+            )
+
+    def update_count(self):
+        """Returns how many times entries have been edited in place (by any process)."""
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM counters WHERE name = 'updates'").fetchone()
+        return row[0] if row else 0
+
+    def compact_journal(self):
+        """Writes the edits the review app journaled for this store into it.
+
+        The review app only folds its journal in after COMPACT_AFTER edits;
+        readers call this so they see the rest too.
+        """
+        compact(self.path, lambda patches: self.update_many(patches.values()))
+
+    def get(self, email_id):
+        """Returns the entry for email_id, or None."""
+        with self._lock:
+            row = self._conn.execute("SELECT entry FROM entries WHERE email_id = ?", (email_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def sender_labels(self):
+        """Returns (sender, verified category) for every entry, without decoding the bodies."""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT json_extract(entry, '$.metadata.sender'), json_extract(entry, '$.training_data.output') "
+                "FROM entries ORDER BY seq"
+            ).fetchall()
+
+    def __contains__(self, email_id):
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM entries WHERE email_id = ?", (email_id,)).fetchone() is not None
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+    def __iter__(self):
+        """Yields entries in insertion order, reading 500 rows at a time."""
+        for _, entry in self.entries_since(0):
+            yield entry
+
+    def entries_since(self, seq):
+        """Yields (seq, entry) for entries added after seq, in insertion order.
+
+        seq values only grow, so callers that remember the last one they saw
+        can pick up just the entries added since.
+        """
+        last_seq = seq
+        while True:
+            with self._lock:
+                rows = self._conn.execute(
+                    "SELECT seq, entry FROM entries WHERE seq > ? ORDER BY seq LIMIT ?", (last_seq, 500)
+                ).fetchall()
+            if not rows:
+                return
+            for last_seq, entry in rows:
+                yield last_seq, json.loads(entry)
+
+def get_verified_store():
+    """Returns the session-wide VerifiedStore."""
+    global _store
+    if _store is None:
+        _store = VerifiedStore()
+        _store.compact_journal()
+    return _store